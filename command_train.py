@@ -327,6 +327,15 @@ if parameters['mode'] == 'train':
       #   train_loader = DataLoader(dataset=train_set, batch_size=batch_size, sampler=train_sampler)
       #   valid_loader = DataLoader(dataset=valid_set, batch_size=batch_size, sampler=valid_sampler)
       #   test_loader = DataLoader(dataset=test_set, batch_size=batch_size, sampler=test_sampler)
+        # move in-RAM snapshots to shared memory, so the spawned ranks mmap the
+        # same pages instead of each pickling its own copy of the whole set
+        for dset in (train_set, valid_set, test_set):
+            if torch.is_tensor(dset): dset.share_memory_()
+            elif isinstance(dset, MyTensorDataset):
+               # the snapshots themselves stay on disk (.pt paths), but the
+               # preloaded scaling tensors ride along with every rank
+               if torch.is_tensor(dset.tk): dset.tk.share_memory_()
+               if torch.is_tensor(dset.tb): dset.tb.share_memory_()
         mp.spawn(train_model_DDP,
                args=(autoencoder, 
                      train_set,
@@ -138,7 +138,6 @@ class SFC_CAE_Encoder(nn.Module):
     if self.variational:
        self.layerMu = nn.Linear(self.size_fc[-2], self.size_fc[-1])
        self.layerSig = nn.Linear(self.size_fc[-2], self.size_fc[-1])
-       self.Normal01 = torch.distributions.Normal(0, 1)
        if self.init_param is not None: 
             self.layerMu.weight.data.uniform_(self.init_param[0], self.init_param[1])
             self.layerMu.bias.data.fill_(0.001)
@@ -201,7 +200,8 @@ class SFC_CAE_Encoder(nn.Module):
     if self.variational:
       mu = self.layerMu(x)
       sigma = torch.exp(self.layerSig(x))
-      sample = self.Normal01.sample(mu.shape).to(x.device)
+      # on-device RNG, no host-side sample + H2D copy per forward
+      sample = torch.randn_like(mu)
       x = mu + sigma * sample
       kl_div = ((sigma**2 + mu**2 - torch.log(sigma) - 1/2).sum()) / (mu.shape[0] * self.input_size * self.components)
       return x, kl_div
@@ -68,8 +68,13 @@ class SFC_CAE_Encoder_Adaptive(nn.Module):
     # self.NN_neighs = []
     self.num_neigh = 3
     # for i in range(self.sfc_nums):self.NN_neighs.append(get_neighbourhood_md(self.orderings[i], gen_neighbour_keys(1), ordering = True))
-    self.NN_neigh_1d = get_neighbourhood_md(torch.arange(self.input_size).long(), gen_neighbour_keys(1), ordering = True)
-    self.second_sfc = sfc_mapping_to_structured
+    # registered as a buffer so it follows .to(device) and is not re-copied every forward,
+    # built through the memo cache so repeated constructions (ensembles/sweeps) are free
+    self.register_buffer('NN_neigh_1d', get_neighbourhood_md_cached((self.input_size,), gen_neighbour_keys(1)))
+    # constant topology index, kept as a buffer so .to(device) moves it once
+    # instead of an implicit H2D copy at every forward.
+    if sfc_mapping_to_structured is not None: self.register_buffer('second_sfc', torch.as_tensor(sfc_mapping_to_structured).long())
+    else: self.second_sfc = None
 
     if 'num_final_channels' in kwargs.keys():
         self.num_final_channels = kwargs['num_final_channels']
@@ -107,6 +112,19 @@ class SFC_CAE_Encoder_Adaptive(nn.Module):
         self.batch_normalisation = kwargs['batch_normalisation']
     else: self.batch_normalisation = False
 
+    if 'use_compile' in kwargs.keys():
+        self.use_compile = kwargs['use_compile']
+    else: self.use_compile = False
+    self.compiled_forward = None
+
+    if 'use_amp' in kwargs.keys():
+        self.use_amp = kwargs['use_amp']
+    else: self.use_amp = False
+
+    if 'neigh_cache_dir' in kwargs.keys():
+        self.neigh_cache_dir = kwargs['neigh_cache_dir']
+    else: self.neigh_cache_dir = None
+
     if self.interpolate_num is not None: self.input_size = self.interpolate_num
 
     if 'coords' in kwargs.keys() and kwargs['coords'] is not None:
@@ -223,7 +241,10 @@ class SFC_CAE_Encoder_Adaptive(nn.Module):
          self.Ax = gen_neighbour_keys(ndim=self.dimension, range=self.neighbour_range, direct_neigh=self.direct_neigh)
         #  self.neigh_md = get_neighbourhood_md(self.second_sfc.reshape(self.shape), self.Ax, ordering = True)
          self.num_neigh_md = len(self.Ax) + 1
-         self.neigh_md = get_neighbourhood_md((torch.arange(self.structured_size_input).long()).reshape(self.shape), self.Ax, ordering = True)
+         self.register_buffer('neigh_md', get_neighbourhood_md_cached(self.shape, self.Ax, cache_dir = self.neigh_cache_dir))
+         # the ordering list indexes a num_neigh x tiled copy of the snapshot; folded modulo
+         # the node count it gathers straight from the untiled tensor, so the hot path skips the repeat
+         self.register_buffer('neigh_md_gather', torch.remainder(self.neigh_md, self.neigh_md.shape[0] // self.num_neigh_md).contiguous())
 
          # parameters for expand snapshots
          self.filling_layer = BackwardForwardConnecting(self.input_size, self.structured_size_input)
@@ -239,23 +260,22 @@ class SFC_CAE_Encoder_Adaptive(nn.Module):
             self.coords_channels.append(int(self.channels[i] * self.coords_dim / self.components))
     
     if not self.share_conv_weights:
-      for i in range(self.sfc_nums):
-       self.convs.append([])
-       for j in range(self.size_conv):
+      # fuse the per-sfc conv stacks into one grouped conv per depth, so all sfc branches
+      # are computed with a single kernel launch per layer instead of a Python loop.
+      for j in range(self.size_conv):
            in_channels = self.channels[j]
            if self.coords is not None and self.coords_option == 2: in_channels += self.coords_channels[j]
            out_channels = self.channels[j+1]
-           if sfc_mapping_to_structured is None: 
-              self.convs[i].append(nn.Conv1d(in_channels, out_channels, kernel_size=self.kernel_size, stride=self.stride, padding=self.padding))
+           if sfc_mapping_to_structured is None:
+              self.convs.append(nn.Conv1d(in_channels * self.sfc_nums, out_channels * self.sfc_nums, kernel_size=self.kernel_size, stride=self.stride, padding=self.padding, groups=self.sfc_nums))
            else:
               if self.dimension == 2:
-                  self.convs[i].append(nn.Conv2d(in_channels, out_channels, kernel_size=self.kernel_size, stride=self.stride, padding=self.padding))
+                  self.convs.append(nn.Conv2d(in_channels * self.sfc_nums, out_channels * self.sfc_nums, kernel_size=self.kernel_size, stride=self.stride, padding=self.padding, groups=self.sfc_nums))
               elif self.dimension == 3:
-                  self.convs[i].append(nn.Conv3d(in_channels, out_channels, kernel_size=self.kernel_size, stride=self.stride, padding=self.padding))
-           if self.init_param is not None: 
-              self.convs[i][j].weight.data.uniform_(self.init_param[0], self.init_param[1])
-              self.convs[i][j].bias.data.fill_(0.001)
-       self.convs[i] = nn.ModuleList(self.convs[i])
+                  self.convs.append(nn.Conv3d(in_channels * self.sfc_nums, out_channels * self.sfc_nums, kernel_size=self.kernel_size, stride=self.stride, padding=self.padding, groups=self.sfc_nums))
+           if self.init_param is not None:
+              self.convs[j].weight.data.uniform_(self.init_param[0], self.init_param[1])
+              self.convs[j].bias.data.fill_(0.001)
     else:
        for i in range(self.size_conv):
            in_channels = self.channels[i]
@@ -274,6 +294,12 @@ class SFC_CAE_Encoder_Adaptive(nn.Module):
 
     self.convs = nn.ModuleList(self.convs)
 
+    # channels-last lets cuDNN pick the coalesced NHWC/NDHWC kernels on the structured conv path
+    if self.second_sfc is not None and self.dimension in (2, 3) and self.coords is None:
+       self.conv_memory_format = torch.channels_last if self.dimension == 2 else torch.channels_last_3d
+       self.convs = self.convs.to(memory_format = self.conv_memory_format)
+    else: self.conv_memory_format = None
+
     if self.NN:
       if not self.share_sp_weights: 
         self.sps = []
@@ -306,7 +332,6 @@ class SFC_CAE_Encoder_Adaptive(nn.Module):
     if self.variational:
        self.layerMu = nn.Linear(self.size_fc[-2], self.size_fc[-1])
        self.layerSig = nn.Linear(self.size_fc[-2], self.size_fc[-1])
-       self.Normal01 = torch.distributions.Normal(0, 1)
        if self.init_param is not None: 
             self.layerMu.weight.data.uniform_(self.init_param[0], self.init_param[1])
             self.layerMu.bias.data.fill_(0.001)
@@ -317,19 +342,31 @@ class SFC_CAE_Encoder_Adaptive(nn.Module):
        if self.init_param is not None: 
             self.fcs[-1].weight.data.uniform_(self.init_param[0], self.init_param[1])
             self.fcs[-1].bias.data.fill_(0.001)
-    self.fcs = nn.ModuleList(self.fcs)
+    # interleave the activation so the fc stack is one callable, letting TorchScript
+    # fuse the linear + activation pairs (see optimize_for_inference() in utils.py)
+    fc_stack = []
+    for fc in self.fcs:
+        fc_stack.append(fc)
+        fc_stack.append(self.activate)
+    self.fcs = nn.Sequential(*fc_stack)
+
+    # sparsify() is plain strided index selection and conv_size is fixed, so bake the
+    # per-level coarsening indexes once instead of re-slicing the coords every forward.
+    if self.coords is not None and self.coords_option == 2:
+       for i in range(1, len(self.conv_size)):
+           self.register_buffer('ctoa_idx_%d' % i, torch.from_numpy(sparsify(np.arange(self.conv_size[0]), self.conv_size[i])).long())
 
   def build_coarsened_coords(self, ordered_coords):
-       self.ctoa = []
-       if not self.share_conv_weights:
-          for i in range(self.sfc_nums):
-             for j in range(len(self.conv_size)):
-                if j == 0: self.ctoa.append(ordered_coords)   
-                else: self.ctoa.append(sparsify(ordered_coords, self.conv_size[j]))
-       else:
-          for i in range(len(self.conv_size)):
-              if i == 0: self.ctoa.append(ordered_coords)   
-              else: self.ctoa.append(sparsify(ordered_coords, self.conv_size[i]))  
+       # coarsened coords for ONE sfc branch: the coords are gathered under that sfc's
+       # own ordering before coarsening, so every branch needs its own per-level tables
+       # (self.ctoa_rep holds one such list per sfc). Each level is a single
+       # index_select with the indexes baked in __init__.
+       ctoa = [ordered_coords]
+       for i in range(1, len(self.conv_size)):
+           ctoa.append(ordered_coords.index_select(-1, getattr(self, 'ctoa_idx_%d' % i)))
+       # expand to the per-layer channel counts once here, the encoder and decoder conv
+       # loops then reuse these instead of one .repeat + .to(device) per layer per sfc.
+       return [ctoa[i].repeat(1, self.coords_channels[i] // self.coords_dim, 1) for i in range(len(ctoa))]
 
   def forward(self, x, sfcs, filling_paras, coords=None, sfc_shuffle_index=None):
     '''
@@ -340,103 +377,212 @@ class SFC_CAE_Encoder_Adaptive(nn.Module):
     sfc_shuffle_index: [numpy.ndarray] an index to shuffle, default is None (not shuffle).
     '''
 
-    xs = []
     if self.collect_loss_inside: self.a_s = []
     self.device = x[0].device
 
-    # 1D or MD Conv Layers
+    # fast path: the backward-forward filling is itself an index gather, so fusing it
+    # into the sfc rows gives every snapshot a uniform length and all the per-sfc /
+    # per-snapshot gathers collapse into one batched torch.gather kernel.
+    if coords is None and self.interpolate_num is None \
+       and all(fla is None or (isinstance(fla[0], BackwardForwardConnecting) and fla[0].interpolate) for fla in filling_paras):
+       # pad the snapshots to one source length, the padded tail is never gathered
+       X = pad_snapshot_list(x)
+       # gather requires int64 indexes, convert the whole index block in one go
+       idx = []
+       for sfc, fla in zip(sfcs, filling_paras):
+           rows = torch.as_tensor(sfc).long().to(self.device, non_blocking = True)
+           if fla is not None: rows = rows[..., backward_forward_indexes(fla[0], rows.device)]
+           idx.append(rows)
+       idx = torch.stack(idx)
+       if sfc_shuffle_index is not None: idx = idx[:, np.asarray(sfc_shuffle_index)[:self.sfc_nums]]
+       else: idx = idx[:, :self.sfc_nums]
+       a = torch.gather(X.unsqueeze(1).expand(-1, self.sfc_nums, -1, -1), -1, idx.unsqueeze(2).expand(-1, -1, X.shape[1], -1))
+       if self.collect_loss_inside:
+          for i in range(self.sfc_nums):
+              self.a_s.append(a[:, i].squeeze(1) if x[0].ndim == 1 else a[:, i])
+       a = a.transpose(0, 1).flatten(0, 1)
+       return self.gathered_forward(a)
+
+    # interpolation path: bucket the variable-length gathers by source length and run
+    # one batched interpolation kernel per bucket — the weights only depend on the
+    # (source, target) lengths, mirroring the grouping on the decoder side.
+    if coords is None and self.interpolate_num is not None:
+       A = None
+       batch_n = len(x)
+       for i in range(self.sfc_nums):
+           gathered = [None] * batch_n
+           for k, sfc in enumerate(sfcs):
+               if sfc_shuffle_index is not None: sfc_index = sfc_shuffle_index[i]
+               else: sfc_index = i
+               sfc_idx = torch.as_tensor(sfc[sfc_index]).long().to(x[k].device, non_blocking = True)
+               gathered[k] = torch.index_select(x[k], -1, sfc_idx)
+           groups = {}
+           for k, fla in enumerate(filling_paras):
+               if fla is not None: groups.setdefault(gathered[k].shape[-1], []).append(k)
+           for ks in groups.values():
+               out = linear_interpolate_python(torch.stack([gathered[k] for k in ks]), *filling_paras[ks[0]][0])
+               for kk, k in enumerate(ks): gathered[k] = out[kk]
+           if A is None: A = torch.empty((self.sfc_nums * batch_n,) + gathered[0].shape, device = gathered[0].device, dtype = gathered[0].dtype)
+           for k in range(batch_n): A[i * batch_n + k] = gathered[k]
+           if self.collect_loss_inside: self.a_s.append(A[i * batch_n : (i + 1) * batch_n])
+       return self.gathered_forward(A)
+
+    # 1D or MD Conv Layers: every gathered snapshot is written straight into its slot of
+    # one preallocated sfc-folded tensor, instead of two full torch.stack copy passes.
+    A = None
+    data_channels = None
+    batch_n = len(x)
+    if coords is not None and self.coords_option == 2: self.ctoa_rep = [None] * self.sfc_nums
     for i in range(self.sfc_nums):
-        a = []
-        if coords is not None: 
-           cds = []
-         #   cds = copy.deepcopy(coords)
         for k, (sfc, fla) in enumerate(zip(sfcs, filling_paras)):
             if sfc_shuffle_index is not None: sfc_index = sfc_shuffle_index[i]
             else: sfc_index = i
-            a.append(x[k].clone()[..., sfc[sfc_index]])
+            # index_select already returns a fresh tensor, no .clone() copy needed
+            sfc_idx = torch.as_tensor(sfc[sfc_index]).long().to(x[k].device, non_blocking = True)
+            a_k = torch.index_select(x[k], -1, sfc_idx)
+            if coords is not None: cds_k = torch.index_select(coords[k], -1, sfc_idx)
+            if fla is not None:
+               if self.interpolate_num is None:
+                  # a_k = expand_snapshot_backward_connect(a_k, *fla, self.place_center)
+                  a_k = fla[0](a_k)
+               else: a_k = linear_interpolate_python(a_k, *fla[0])
+               if coords is not None:
+                 if self.interpolate_num is None:
+                    cds_k = fla[0](cds_k)
+                 else:
+                    cds_k = linear_interpolate_python(cds_k, *fla[0])
+            if A is None:
+               data_channels = a_k.shape[0] if a_k.ndim > 1 else None
+               if coords is not None: folded_shape = (self.sfc_nums * batch_n, data_channels + cds_k.shape[0]) + a_k.shape[1:]
+               else: folded_shape = (self.sfc_nums * batch_n,) + a_k.shape
+               A = torch.empty(folded_shape, device = a_k.device, dtype = a_k.dtype)
             if coords is not None:
-                   cds.append(coords[k].clone()[..., sfc[sfc_index]])            
-            if fla is not None: 
-               if self.interpolate_num is None: 
-                  # a[k] = expand_snapshot_backward_connect(a[k], *fla, self.place_center)
-                  a[k] = fla[0](a[k])
-               else: a[k] = linear_interpolate_python(a[k], *fla[0])
-               if coords is not None:                  
-                 if self.interpolate_num is None: 
-                  # cds[k] = expand_snapshot_backward_connect(cds[k], *fla, self.place_center)
-                    cds[k] = fla[0](cds[k])
-                 else: 
-                    cds[k] = linear_interpolate_python(cds[k], *fla[0])
-        if coords is not None:
-            cds = torch.stack(cds)
-            if self.coords_option == 2: self.build_coarsened_coords(cds)
-        a = torch.stack(a)
-        if self.collect_loss_inside: self.a_s.append(a)
-        if coords is not None: a = torch.cat((a, cds), 1)
-        if self.batch_normalisation: a = self.batch_norm(a)
-        # print(a.shape)
-        if self.self_concat > 1: 
-           if a.ndim == 2: a = a.unsqueeze(1)
-           a = torch.cat([a] * self.self_concat, 1)  
-        # print(a.shape)      
-        if self.second_sfc is not None: 
-            # a = expand_snapshot_backward_connect(a, *self.expand_paras, place_center = self.place_center)
-            a = self.filling_layer(a)
-            # print(a.shape)
-            a = a[..., self.second_sfc]
-            if self.NN:
-               tt_list = get_concat_list_md(a, self.neigh_md, self.num_neigh_md)
-            #    print(tt_list.shape)
-               if not self.share_sp_weights: tt_nn = self.sps[i](tt_list)
-               else: tt_nn = self.sps(tt_list)
-               a = self.activate(tt_nn)
-               del tt_list
-               del tt_nn
-            a = a.reshape(a.shape[:-1] + self.shape)
-        else: 
-            if self.NN:
-               if self.coords is not None and not self.ban_shuffle_sp: tt_list = a
-               else: tt_list = get_concat_list_md(a, self.NN_neigh_1d, self.num_neigh)
-               if not self.share_sp_weights: tt_nn = self.sps[i](tt_list)
-               else: tt_nn = self.sps(tt_list)
-               a = self.activate(tt_nn)
-               del tt_list
-               del tt_nn   
-            # a = a.reshape((a.shape[0], self.input_channel, self.input_size)) 
-        # if self.input_channel > 1: a = a.view(-1, self.input_channel, self.input_size)
-        # else: a = a.unsqueeze(1)
-        if self.share_conv_weights: conv_layer = self.convs
-        else: conv_layer = self.convs[i]
-        for j in range(self.size_conv):
-            if self.coords is not None and self.coords_option == 2: 
-               # we feed the coarsened coords in each conv layer
-               a = torch.cat((a, self.ctoa[j].repeat(1, self.coords_channels[j] // self.coords_dim,1).to(a.device)),1)
-            a = self.activate(conv_layer[j](a))
-        # xs.append(a.view(-1, a.size(1)*a.size(2)))
-      #   a = a.reshape(a.shape[0], -1)
-        a = a.view(-1, np.prod(a.shape[1:]))
-        xs.append(a)
-        # print(a.shape)
-        del a
-    del x
-    if self.sfc_nums > 1: x = torch.cat(xs, 1)
-    else: x = xs[0]
-    # x = x.reshape(x.shape[0], -1)
-    for i in range(self.sfc_nums): del xs[0] # clear memory 
-
-    # fully connect layers
-    for i in range(len(self.fcs)): x = self.activate(self.fcs[i](x))
+               A[i * batch_n + k, :data_channels] = a_k
+               A[i * batch_n + k, data_channels:] = cds_k
+            else: A[i * batch_n + k] = a_k
+        if coords is not None and self.coords_option == 2:
+            self.ctoa_rep[i] = self.build_coarsened_coords(A[i * batch_n : (i + 1) * batch_n, data_channels:])
+        if self.collect_loss_inside:
+            if coords is not None: self.a_s.append(A[i * batch_n : (i + 1) * batch_n, :data_channels])
+            else: self.a_s.append(A[i * batch_n : (i + 1) * batch_n])
+
+    # the sfc axis is already folded into the batch axis, so the filling layer, the
+    # neighbour gather and the sparse layers run once over all sfcs instead of sfc_nums times.
+    return self.gathered_forward(A)
+
+  def gathered_forward(self, a):
+    '''
+    Run the sfc-folded tensor {a} through the fixed-shape compute and the
+    variational sampling, shared by the batched and the per-snapshot gather paths.
+    '''
+    # the post-gather path sees a fixed shape, so it can be captured by torch.compile,
+    # the adaptive gather above stays eager to avoid per-shape recompilation.
+    # the conv + fc stacks are the FLOP-dominant part, run them in bf16 under autocast
+    # if asked for, the variational sampling below stays in fp32.
+    with torch.cuda.amp.autocast(enabled = self.use_amp and a.is_cuda, dtype = torch.bfloat16):
+       if self.use_compile and hasattr(torch, 'compile'):
+          if self.compiled_forward is None:
+             self.compiled_forward = torch.compile(self.conv_fc_forward, mode = 'reduce-overhead', dynamic = False)
+          x = self.compiled_forward(a)
+       else: x = self.conv_fc_forward(a)
+    if self.use_amp and x.dtype is not torch.float32: x = x.float()
 
     # variational sampling
     if self.variational:
       mu = self.layerMu(x)
       sigma = torch.exp(self.layerSig(x))
-      sample = self.Normal01.sample(mu.shape).to(x.device)
+      # on-device RNG, no host-side sample + H2D copy per forward
+      sample = torch.randn_like(mu)
       x = mu + sigma * sample
       kl_div = ((sigma**2 + mu**2 - torch.log(sigma) - 1/2).sum()) / (mu.shape[0] * self.input_size * self.components)
       return x, kl_div
     else: return x
 
+  def conv_fc_forward(self, a):
+    '''
+    The fixed-shape part of the encoder forward: sparse layers, conv stack and
+    fully-connected layers, applied on the sfc-folded tensor {a}.
+    '''
+    if a.ndim == 2: a = a.unsqueeze(1)
+    if self.batch_normalisation: a = self.batch_norm(a)
+    # print(a.shape)
+    # the self_concat copies are linear through the first conv, so when no sparse layer
+    # consumes them we fold the copy into the conv weights (see fold_first_conv) instead
+    # of materialising a self_concat x larger input; otherwise the copy is delayed past
+    # the channel-wise filling layer and sfc gather, which then run on 1/self_concat of the data.
+    fold_first = self.self_concat > 1 and not self.NN and (self.coords is None or self.coords_option != 2)
+    if self.second_sfc is not None:
+        # a = expand_snapshot_backward_connect(a, *self.expand_paras, place_center = self.place_center)
+        a = self.filling_layer(a)
+        # print(a.shape)
+        a = a[..., self.second_sfc]
+        if self.self_concat > 1 and not fold_first: a = torch.cat([a] * self.self_concat, 1)
+        if self.NN:
+           # fused neighbour product, the num_neigh x concat intermediate is never materialised
+           if not self.share_sp_weights: tt_nn = torch.cat([nearest_neighbouring_sp_md(tt, self.sps[i], self.neigh_md_gather, self.num_neigh_md) for i, tt in enumerate(torch.chunk(a, self.sfc_nums, 0))], 0)
+           else: tt_nn = nearest_neighbouring_sp_md(a, self.sps, self.neigh_md_gather, self.num_neigh_md)
+           a = self.activate(tt_nn)
+        a = a.reshape(a.shape[:-1] + self.shape)
+    else:
+        if self.self_concat > 1 and not fold_first: a = torch.cat([a] * self.self_concat, 1)
+        if self.NN:
+           if self.coords is not None and not self.ban_shuffle_sp:
+              if not self.share_sp_weights: tt_nn = torch.cat([self.sps[i](tt) for i, tt in enumerate(torch.chunk(a, self.sfc_nums, 0))], 0)
+              else: tt_nn = self.sps(a)
+           else:
+              # sliding-window form of the neighbour product, no concat tensor materialised
+              if not self.share_sp_weights: tt_nn = torch.cat([nearest_neighbouring_sp_1d(tt, self.sps[i]) for i, tt in enumerate(torch.chunk(a, self.sfc_nums, 0))], 0)
+              else: tt_nn = nearest_neighbouring_sp_1d(a, self.sps)
+           a = self.activate(tt_nn)
+        # a = a.reshape((a.shape[0], self.input_channel, self.input_size))
+
+    if not self.share_conv_weights:
+       # all sfc branches concatenated on the channel axis, one grouped kernel per layer
+       a = a.view((self.sfc_nums, -1) + a.shape[1:]).transpose(0, 1).flatten(1, 2)
+       if self.conv_memory_format is not None: a = a.contiguous(memory_format = self.conv_memory_format)
+       for j in range(self.size_conv):
+           if self.coords is not None and self.coords_option == 2:
+              # we feed each sfc group its own coarsened coords in each conv layer
+              ctoa_j = torch.stack([rep[j] for rep in self.ctoa_rep], 1)
+              a = a.view((a.shape[0], self.sfc_nums, -1) + a.shape[2:])
+              a = torch.cat((a, ctoa_j), 2)
+              a = a.flatten(1, 2)
+           if j == 0 and fold_first: a = self.activate(self.fold_first_conv(a, self.convs[0], self.sfc_nums))
+           else: a = self.activate(self.convs[j](a))
+       x = a.flatten(1)
+    else:
+       # write each sfc's flat output straight into its slice of the concatenated
+       # tensor, saves the torch.cat allocation and the old list cleanup loop.
+       split = self.size_fc[0] // self.sfc_nums
+       x = None
+       for i, a_i in enumerate(torch.chunk(a, self.sfc_nums, 0)):
+           if self.conv_memory_format is not None: a_i = a_i.contiguous(memory_format = self.conv_memory_format)
+           for j in range(self.size_conv):
+               if self.coords is not None and self.coords_option == 2:
+                  # we feed this sfc's own coarsened coords in each conv layer
+                  a_i = torch.cat((a_i, self.ctoa_rep[i][j]), 1)
+               if j == 0 and fold_first: a_i = self.activate(self.fold_first_conv(a_i, self.convs[0], 1))
+               else: a_i = self.activate(self.convs[j](a_i))
+           a_i = a_i.flatten(1)
+           if x is None: x = torch.empty((a_i.shape[0], split * self.sfc_nums), device = a_i.device, dtype = a_i.dtype)
+           x[:, i * split : (i + 1) * split] = a_i
+
+    # fully connect layers
+    x = self.fcs(x)
+    return x
+
+  def fold_first_conv(self, a, conv, groups):
+    '''
+    Apply {conv} on the un-duplicated input {a}: the self_concat channel copies are
+    identical, so summing the conv weights over the copy blocks gives exactly the same
+    output (and gradients) as duplicating the input, without the self_concat x memory traffic.
+    '''
+    w = conv.weight
+    w = w.view((w.shape[0], self.self_concat, w.shape[1] // self.self_concat) + w.shape[2:]).sum(1)
+    if w.ndim == 3: return fn.conv1d(a, w, conv.bias, stride = conv.stride, padding = conv.padding, groups = groups)
+    elif w.ndim == 4: return fn.conv2d(a, w, conv.bias, stride = conv.stride, padding = conv.padding, groups = groups)
+    else: return fn.conv3d(a, w, conv.bias, stride = conv.stride, padding = conv.padding, groups = groups)
+
 
 ###############################################################   Decoder Part ###################################################################
 
@@ -488,6 +634,7 @@ class SFC_CAE_Decoder_Adaptive(nn.Module):
     self.collect_loss_inside = encoder.collect_loss_inside
     self.interpolate_num = encoder.interpolate_num
     self.batch_normalisation = encoder.batch_normalisation
+    self.use_amp = encoder.use_amp
 
     if encoder.coords is not None:
       self.coords = encoder.coords
@@ -511,21 +658,24 @@ class SFC_CAE_Decoder_Adaptive(nn.Module):
     # self.NN_neighs = []
     self.num_neigh = encoder.num_neigh
     # for i in range(self.sfc_nums):self.NN_neighs.append(get_neighbourhood_md(self.orderings[i], gen_neighbour_keys(1), ordering = True))
-    self.NN_neigh_1d = encoder.NN_neigh_1d
+    # the decoder owns its copies of the topology index buffers, a plain reference to the
+    # encoder's buffer would be left behind on the old device by .to(device).
+    self.register_buffer('NN_neigh_1d', encoder.NN_neigh_1d.clone())
 
     # md Decoder
-    if encoder.second_sfc is None: 
+    if encoder.second_sfc is None:
         self.inv_second_sfc = None
         self.init_convTrans_shape = (encoder.num_final_channels, ) + (encoder.conv_size[-1], )
-        self.num_neigh_md = encoder.num_neigh_md 
-    else: 
-        self.inv_second_sfc = np.argsort(encoder.second_sfc)  
+        self.num_neigh_md = encoder.num_neigh_md
+    else:
+        self.register_buffer('inv_second_sfc', torch.argsort(encoder.second_sfc))
         self.structured_size_input = self.inv_second_sfc.shape[-1]
         self.diff_nodes = encoder.diff_nodes
         self.structured_size = encoder.structured_size
         self.shape = encoder.shape
-        self.num_neigh_md = encoder.num_neigh_md   
-        self.neigh_md = encoder.neigh_md   
+        self.num_neigh_md = encoder.num_neigh_md
+        self.register_buffer('neigh_md', encoder.neigh_md.clone())
+        self.register_buffer('neigh_md_gather', encoder.neigh_md_gather.clone())
         self.init_convTrans_shape = (encoder.num_final_channels, ) + (encoder.conv_size[-1], ) * self.dimension
         # self.expand_paras = encoder.expand_paras
         self.expand_extract_layer = BackwardForwardConnecting(self.structured_size_input, self.input_size)
@@ -535,30 +685,34 @@ class SFC_CAE_Decoder_Adaptive(nn.Module):
        self.fcs.append(nn.Linear(encoder.size_fc[-k], encoder.size_fc[-k-1]))
        if encoder.init_param is not None: 
             self.fcs[k - 1].weight.data.uniform_(encoder.init_param[0], encoder.init_param[1])
-            self.fcs[k - 1].bias.data.fill_(0.001) 
-    self.fcs = nn.ModuleList(self.fcs)
+            self.fcs[k - 1].bias.data.fill_(0.001)
+    # one fused callable, same as the encoder fc stack
+    fc_stack = []
+    for fc in self.fcs:
+        fc_stack.append(fc)
+        fc_stack.append(self.activate)
+    self.fcs = nn.Sequential(*fc_stack)
 
     # set up convolutional layers, fully-connected layers and sparse layers
     self.convTrans = []
     self.sps = []
     if not self.share_conv_weights:
-      for i in range(self.sfc_nums):
-        self.convTrans.append([])
-        for j in range(1, encoder.size_conv + 1):
-           in_channels = encoder.channels[-j]
-           if self.coords is not None and self.coords_option == 2: in_channels += self.coords_channels[-j]
-           out_channels = encoder.channels[-j-1]
-           if encoder.second_sfc is None:
-              self.convTrans[i].append(nn.ConvTranspose1d(in_channels, out_channels, kernel_size=self.kernel_size, stride=self.stride, padding=encoder.padding, output_padding = encoder.output_paddings[j - 1]))
-           else:
-              if self.dimension == 2:
-                  self.convTrans[i].append(nn.ConvTranspose2d(in_channels, out_channels, kernel_size=self.kernel_size, stride=self.stride, padding=encoder.padding, output_padding = encoder.output_paddings[j - 1]))
-              elif self.dimension == 3:
-                  self.convTrans[i].append(nn.ConvTranspose3d(in_channels, out_channels, kernel_size=self.kernel_size, stride=self.stride, padding=encoder.padding, output_padding = encoder.output_paddings[j - 1]))               
-           if encoder.init_param is not None: 
-              self.convTrans[i][j - 1].weight.data.uniform_(encoder.init_param[0], encoder.init_param[1])
-              self.convTrans[i][j - 1].bias.data.fill_(0.001)       
-        self.convTrans[i] = nn.ModuleList(self.convTrans[i])
+      # mirror of the encoder: the per-sfc transposed conv stacks are fused into one
+      # grouped kernel per depth, all sfc branches run with a single launch per layer.
+      for j in range(1, encoder.size_conv + 1):
+         in_channels = encoder.channels[-j]
+         if self.coords is not None and self.coords_option == 2: in_channels += self.coords_channels[-j]
+         out_channels = encoder.channels[-j-1]
+         if encoder.second_sfc is None:
+            self.convTrans.append(nn.ConvTranspose1d(in_channels * self.sfc_nums, out_channels * self.sfc_nums, kernel_size=self.kernel_size, stride=self.stride, padding=encoder.padding, output_padding = encoder.output_paddings[j - 1], groups=self.sfc_nums))
+         else:
+            if self.dimension == 2:
+                self.convTrans.append(nn.ConvTranspose2d(in_channels * self.sfc_nums, out_channels * self.sfc_nums, kernel_size=self.kernel_size, stride=self.stride, padding=encoder.padding, output_padding = encoder.output_paddings[j - 1], groups=self.sfc_nums))
+            elif self.dimension == 3:
+                self.convTrans.append(nn.ConvTranspose3d(in_channels * self.sfc_nums, out_channels * self.sfc_nums, kernel_size=self.kernel_size, stride=self.stride, padding=encoder.padding, output_padding = encoder.output_paddings[j - 1], groups=self.sfc_nums))
+         if encoder.init_param is not None:
+            self.convTrans[j - 1].weight.data.uniform_(encoder.init_param[0], encoder.init_param[1])
+            self.convTrans[j - 1].bias.data.fill_(0.001)
     else:
         for i in range(1, encoder.size_conv + 1):
             in_channels = encoder.channels[-i]
@@ -579,9 +733,14 @@ class SFC_CAE_Decoder_Adaptive(nn.Module):
        if self.coords is not None and self.extract_by_sp: 
           out_channel = self.components - self.coords_dim
           concats = self.self_concat * self.coords_dim
-       else: 
+       else:
           out_channel = self.components
           concats = self.self_concat
+       # resolved once here, the forward reads the constant instead of re-deriving it per
+       # sfc per call (TorchScript cannot take the list-of-snapshots contract, so partial
+       # evaluation at construction is the specialisation that fits; graph capture itself
+       # is covered by the wrapper's compile_mode flag)
+       self.sp_concats = concats
 
        if not self.share_sp_weights:
           for i in range(self.sfc_nums):
@@ -601,7 +760,12 @@ class SFC_CAE_Decoder_Adaptive(nn.Module):
           else: self.sps = NearestNeighbouring_md(self.shape, None, out_channel, self.num_neigh_md, concats)
 
     self.convTrans = nn.ModuleList(self.convTrans)
-    if self.NN: 
+
+    # keep the structured transposed convs on the same channels-last path as the encoder
+    self.conv_memory_format = encoder.conv_memory_format
+    if self.conv_memory_format is not None: self.convTrans = self.convTrans.to(memory_format = self.conv_memory_format)
+
+    if self.NN:
        if not self.share_sp_weights: self.sps = nn.ModuleList(self.sps) 
        else: self.sps = nn.Sequential(self.sps)[0]        
 
@@ -625,51 +789,87 @@ class SFC_CAE_Decoder_Adaptive(nn.Module):
       self.out_linear_bias = nn.Parameter(torch.zeros(self.components))
 
   def forward(self, x, inv_sfcs, filling_paras, coords=None, sfc_shuffle_index=None):
+    '''
+    Autocast wrapper over decode_forward: the sps neighbour products and the transposed
+    convs are memory-bound, running them in bf16 under autocast (same flag as the
+    encoder) halves their bandwidth; outputs are upcast back to fp32.
+    '''
+    with torch.cuda.amp.autocast(enabled = self.use_amp and x.is_cuda, dtype = torch.bfloat16):
+       data_z = self.decode_forward(x, inv_sfcs, filling_paras, coords, sfc_shuffle_index)
+    if self.use_amp: data_z = [z_k if z_k.dtype is torch.float32 else z_k.float() for z_k in data_z]
+    return data_z
+
+  def decode_forward(self, x, inv_sfcs, filling_paras, coords=None, sfc_shuffle_index=None):
     '''
     x: [list of torch tensors] the adaptive fluid data snapshot, could have multiple components.
     sfcs: [list of sfc orderings] batch of sfc orderings for the adaptive data.
     filling_paras: [list of 'fla' tuples] a list of indexes for filling the paddings, see 'expand_snapshot_backward_connect()' in utils.py.
     coords: [list of torch tensors] the coordinate inputs, could be empty.
     sfc_shuffle_index: [numpy.ndarray] an index to shuffle, default is None (not shuffle).
-    ''' 
+    '''
 
-    for i in range(len(self.fcs)):
-        x = self.activate(self.fcs[i](x))
+    x = self.fcs(x)
     # revert torch.cat
     if self.sfc_nums > 1: x = torch.chunk(x, chunks=self.sfc_nums, dim=1)
     else: x = (x,)
 
     # collect loss inside
-    if self.collect_loss_inside: self.loss = 0
+    if self.collect_loss_inside:
+       self.loss = 0
+       # bind once, nn.Module attribute access resolves through __getattr__ every lookup
+       a_s = self.encoder.a_s
+
+    # the coarsened coords were expanded per sfc and per conv level by the encoder
+    # already, grab the per-sfc lists once
+    if self.coords is not None and self.coords_option == 2: self.ctoa_rep = self.encoder.ctoa_rep
+
+    # with no filling the node counts are uniform, so the per-snapshot inverse-ordering
+    # loop collapses into one batched gather per sfc (mirror of the encoder fast path)
+    batched_inverse = self.interpolate_num is None and all(fla is None for fla in filling_paras)
+
+    if not self.share_conv_weights:
+       # all sfc branches concatenated on the channel axis, one grouped kernel per layer
+       # (mirror of the encoder conv path)
+       b_all = torch.cat([x_i.view((-1,) + self.init_convTrans_shape) for x_i in x], 1)
+       if self.conv_memory_format is not None: b_all = b_all.contiguous(memory_format = self.conv_memory_format)
+       for j in range(self.size_conv):
+           if self.coords is not None and self.coords_option == 2:
+              # we feed each sfc group its own coarsened coords in each conv layer
+              ctoa_j = torch.stack([rep[-j-1] for rep in self.ctoa_rep], 1)
+              b_all = b_all.view((b_all.shape[0], self.sfc_nums, -1) + b_all.shape[2:])
+              b_all = torch.cat((b_all, ctoa_j), 2)
+              b_all = b_all.flatten(1, 2)
+           b_all = self.activate(self.convTrans[j](b_all))
+       b_all = b_all.view((b_all.shape[0], self.sfc_nums, -1) + b_all.shape[2:])
 
     for i in range(self.sfc_nums):
-        # if self.inv_second_sfc is not None: 
+        # if self.inv_second_sfc is not None:
       #   b = x[i].reshape((x[i].shape[0],) + self.init_convTrans_shape)
-        b = x[i].view((-1,) + self.init_convTrans_shape)
-        if self.share_conv_weights: conv_layer = self.convTrans
-        else: conv_layer = self.convTrans[i]
-        if self.coords is not None and self.coords_option == 2: self.ctoa = self.encoder.ctoa
-        for j in range(self.size_conv):
-            if self.coords is not None and self.coords_option == 2: 
-               # we feed the coarsened coords in each conv layer
-               b = torch.cat((b, self.ctoa[-j-1].repeat(1, self.coords_channels[-j-1] // self.coords_dim,1).to(b.device)),1)
-            b = self.activate(conv_layer[j](b))
+        if not self.share_conv_weights: b = b_all[:, i]
+        else:
+           b = x[i].view((-1,) + self.init_convTrans_shape)
+           if self.conv_memory_format is not None: b = b.contiguous(memory_format = self.conv_memory_format)
+           for j in range(self.size_conv):
+               if self.coords is not None and self.coords_option == 2:
+                  # we feed this sfc's own coarsened coords in each conv layer
+                  b = torch.cat((b, self.ctoa_rep[i][-j-1]), 1)
+               b = self.activate(self.convTrans[j](b))
         if self.inv_second_sfc is not None: 
             b = b.reshape(b.shape[:2] + (self.structured_size_input, ))
             # b = b[..., self.inv_second_sfc]
             if self.NN:
               #  print('before decoder concat..')
               #  print(b.shape)
-               if self.coords is not None and not self.ban_shuffle_sp: tt_list = b
-               else: tt_list = get_concat_list_md(b, self.neigh_md, self.num_neigh_md, self.self_concat)
-              #  print(tt_list.shape)
-               if not self.share_sp_weights: tt_nn = self.sps[i](tt_list)
-               else: tt_nn = self.sps(tt_list)
+               if self.coords is not None and not self.ban_shuffle_sp:
+                  if not self.share_sp_weights: tt_nn = self.sps[i](b)
+                  else: tt_nn = self.sps(b)
+               else:
+                  # fused neighbour product, the num_neigh x concat intermediate is never materialised
+                  if not self.share_sp_weights: tt_nn = nearest_neighbouring_sp_md(b, self.sps[i], self.neigh_md_gather, self.num_neigh_md, self.self_concat)
+                  else: tt_nn = nearest_neighbouring_sp_md(b, self.sps, self.neigh_md_gather, self.num_neigh_md, self.self_concat)
                b = self.activate(tt_nn)
-               del tt_list 
-               del tt_nn  
             else:
-               if self.self_concat > 1: b = sum(torch.chunk(b, chunks=self.self_concat, dim=1))
+               if self.self_concat > 1: b = b.view((b.shape[0], self.self_concat, b.shape[1] // self.self_concat) + b.shape[2:]).sum(1)
             b = b[..., self.inv_second_sfc]
             # b = reduce_expanded_snapshot(b, *self.expand_paras, self.place_center, self.reduce) # truncate or mean
             b = self.expand_extract_layer(b)
@@ -678,56 +878,75 @@ class SFC_CAE_Decoder_Adaptive(nn.Module):
             # b = b[..., self.orderings[i]] # backward order refer to first sfc(s).
             # b = b.reshape(b.shape[:2] + (self.input_size, ))
             if self.NN:
-               if self.coords is not None and not self.ban_shuffle_sp: tt_list = b
-               else: 
-                 if self.extract_by_sp: concats = self.self_concat * self.coords_dim
-                 else: concats = self.self_concat
-                 tt_list = get_concat_list_md(b, self.NN_neigh_1d, self.num_neigh, concats)
-               if not self.share_sp_weights: tt_nn = self.sps[i](tt_list)
-               else: tt_nn = self.sps(tt_list)
+               if self.coords is not None and not self.ban_shuffle_sp:
+                  if not self.share_sp_weights: tt_nn = self.sps[i](b)
+                  else: tt_nn = self.sps(b)
+               else:
+                 # sliding-window form of the neighbour product, same as the encoder 1D branch
+                 if not self.share_sp_weights: tt_nn = nearest_neighbouring_sp_1d(b, self.sps[i], self.sp_concats)
+                 else: tt_nn = nearest_neighbouring_sp_1d(b, self.sps, self.sp_concats)
                b = self.activate(tt_nn)
-               del tt_list
-               del tt_nn
             else: 
-              if self.self_concat > 1: b = sum(torch.chunk(b, chunks=self.self_concat, dim=1))
+              if self.self_concat > 1: b = b.view((b.shape[0], self.self_concat, b.shape[1] // self.self_concat) + b.shape[2:]).sum(1)
 
         if not self.extract_by_sp: b = b[:, :self.components - self.coords_dim]
         
-        if self.collect_loss_inside:  
-           self.loss += nn.MSELoss()(b, self.encoder.a_s[i])
+        if self.collect_loss_inside:
+           # functional form, no nn.MSELoss module allocation per sfc per forward
+           self.loss = self.loss + fn.mse_loss(b, a_s[i])
         # print(b.shape)
   
-        b = list(b)
+        if batched_inverse:
+           if sfc_shuffle_index is not None: sfc_index = sfc_shuffle_index[i]
+           else: sfc_index = i
+           inv_idx = torch.stack([torch.as_tensor(inv_sfc[sfc_index]).long() for inv_sfc in inv_sfcs]).to(b.device, non_blocking = True)
+           b = torch.gather(b, -1, inv_idx.unsqueeze(1).expand(-1, b.shape[1], -1))
+           # gather already returned a fresh tensor, accumulate into it directly
+           if i == 0: data_z = b
+           else: data_z.add_(b)
+           continue
+
+        if i == 0: data_z = [None] * len(inv_sfcs)
         if self.coords_dim is not None: coords_b_list = []
+        interp_b = None
+        if self.interpolate_num is not None:
+           # the source length is uniform on the decoder side, so snapshots with the same
+           # node count share one weight set: interpolate each such group in a single call
+           groups = {}
+           for k, fla in enumerate(filling_paras):
+               if fla is not None: groups.setdefault(len(fla[-1][0]), []).append(k)
+           interp_b = [None] * len(filling_paras)
+           for ks in groups.values():
+               out = linear_interpolate_python(b[ks], *filling_paras[ks[0]][-1])
+               for kk, k in enumerate(ks): interp_b[k] = out[kk]
         for k, (inv_sfc, fla) in enumerate(zip(inv_sfcs, filling_paras)):
             if sfc_shuffle_index is not None: sfc_index = sfc_shuffle_index[i]
             else: sfc_index = i
-            if fla is not None: 
-               if self.interpolate_num is None: 
-                  # b[k] = reduce_expanded_snapshot(b[k], *fla, self.place_center, self.reduce)
-                  b[k] = fla[1](b[k])
-               else: 
-                  b[k] = linear_interpolate_python(b[k], *fla[-1])
-            b[k] = b[k][..., inv_sfc[sfc_index]].squeeze(0)
-            # if self.coords_dim is not None: 
-            #    coords_b_list.append(b[k][-self.coords_dim:])
-            #    if not self.extract_by_sp: b[k] = b[k][:self.components - self.coords_dim].unsqueeze(-1)
-            #    else: b[k] = b[k].unsqueeze(-1)
-            b[k] = b[k].unsqueeze(-1)
-              #  print('b[k] shape:', b[k].shape)
-        if i == 0: 
-           data_z = []
-           for k in range(len(b)): 
-            data_z.append(b[k].clone())
-        else: 
-            for k in range(len(b)): 
-              data_z[k] = torch.cat((data_z[k], b[k]), dim=-1)      
-              # print('z[k] shape:', data_z[k].shape)   
+            b_k = b[k]
+            if fla is not None:
+               if self.interpolate_num is None:
+                  # b_k = reduce_expanded_snapshot(b_k, *fla, self.place_center, self.reduce)
+                  b_k = fla[1](b_k)
+               else:
+                  b_k = interp_b[k]
+            inv_idx = torch.as_tensor(inv_sfc[sfc_index]).long().to(b_k.device, non_blocking = True)
+            b_k = torch.index_select(b_k, -1, inv_idx).squeeze(0)
+            # if self.coords_dim is not None:
+            #    coords_b_list.append(b_k[-self.coords_dim:])
+            #    if not self.extract_by_sp: b_k = b_k[:self.components - self.coords_dim].unsqueeze(-1)
+            #    else: b_k = b_k.unsqueeze(-1)
+            # the stacked sfc axis was only ever summed, so accumulate in place instead of
+            # materialising the (..., sfc_nums) tensor and reducing it afterwards; the
+            # index_select output is fresh, no defensive clone needed before add_.
+            if i == 0: data_z[k] = b_k
+            else: data_z[k].add_(b_k)
     # if self.inv_second_sfc is not None: return z[..., :self.input_size]
-    # else: 
-    for i in range(len(data_z)): 
-        data_z[i] = self.activate(data_z[i].sum(-1))
-        # data_z[i] = self.activate(data_z[i])
+    # else:
+    # squeeze the channel dim per snapshot so single-component outputs come back as
+    # (N,) here as well, matching the per-snapshot path below
+    if batched_inverse: return [b_z.squeeze(0) for b_z in torch.unbind(self.activate(data_z), 0)]
+    for i in range(len(data_z)):
+        data_z[i] = self.activate(data_z[i])
     return data_z
 
 
@@ -795,7 +1014,7 @@ class SFC_CAE_Adaptive(nn.Module):
                sfc_mapping_to_structured,
                **kwargs)
     self.decoder = SFC_CAE_Decoder_Adaptive(self.encoder, output_linear, reduce_strategy)
-   
+
     # specify name of the activation
     if isinstance(self.encoder.activate, type(nn.ReLU())):
       self.activate = 'ReLU'
@@ -804,6 +1023,16 @@ class SFC_CAE_Adaptive(nn.Module):
     elif isinstance(self.encoder.activate, type(nn.SELU())):
       self.activate = 'SELU'
 
+    # whole-module torch.compile: the per-snapshot Python loops force graph breaks, so we
+    # keep fullgraph off and dynamic shapes on to avoid recompiling per node count; the
+    # encoder's 'use_compile' kwarg stays as the finer option for its fixed-shape region only.
+    if 'compile_mode' in kwargs.keys(): self.compile_mode = kwargs['compile_mode']
+    else: self.compile_mode = None
+    if self.compile_mode is not None:
+       mode = self.compile_mode if isinstance(self.compile_mode, str) else None
+       self.encoder = torch.compile(self.encoder, mode = mode, fullgraph = False, dynamic = True)
+       self.decoder = torch.compile(self.decoder, mode = mode, fullgraph = False, dynamic = True)
+
   def forward(self, x, sfcs, inv_sfcs, filling_paras, coords=None, sfc_shuffle_index=None):
    '''
    x - [Torch.Tensor.float] A batch of fluid snapshots from the data-loader
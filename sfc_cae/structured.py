@@ -238,8 +238,12 @@ def get_MFT_RNN_curves_structured(size, num, dim=2):
     print(F'The Fortran library takes %s to generate sfcs.'% time_str)
 
     for i in range(space_filling_curve_numbering.shape[-1]):
-        curve_lists.append(np.argsort(space_filling_curve_numbering[:,i]))
-        inv_lists.append(np.argsort(np.argsort(space_filling_curve_numbering[:,i])))
+        # invert the permutation with an O(N) scatter instead of a second argsort
+        curve = np.argsort(space_filling_curve_numbering[:,i], kind = 'stable')
+        inv = np.empty_like(curve)
+        inv[curve] = np.arange(curve.size)
+        curve_lists.append(curve)
+        inv_lists.append(inv)
 
     return curve_lists, inv_lists
    
@@ -17,16 +17,26 @@ from .utils import *
 from .sfc_cae import *
 from .sfc_cae_md import *
 from .sfc_cae_adaptive import *
-# for other custom Pytorch Optimizers
-from timm import optim as tioptim
 # Distributed Data Parallel
 import torch.distributed as dist
 from torch.nn.parallel import DistributedDataParallel as DDP
 import torch.multiprocessing as mp
-from torch.utils.data import distributed
 
 device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
 
+# filling modules reused across batches in 'shuffle_sfc_with_batch', keyed by (source_len, target_len)
+_bfc_cache = {}
+
+# active torch.profiler handle, stepped once per batch by the train loops
+_profiler = None
+
+# optimizer factory table for train_model
+OPTIMIZERS = {'Adam': torch.optim.Adam, 'Adamax': torch.optim.Adamax, 'SGD': torch.optim.SGD,
+              'Adagrad': torch.optim.Adagrad, 'AdamW': torch.optim.AdamW}
+# other custom Pytorch optimizers, from https://github.com/rwightman/pytorch-image-models/tree/master/timm/optim
+# only the class names here — timm is imported lazily, it costs a few hundred ms at import
+TIMM_OPTIMIZERS = {'Nadam': 'Nadam', 'AdamP': 'AdamP', 'RAdam': 'RAdam', 'madgrad': 'MADGRAD', 'RMSprop': 'RMSpropTF'}
+
 # set training device id, always from 0 to n.
 visible_devices = ','.join(map(str, np.arange(torch.cuda.device_count()).astype('int')))
 os.environ['CUDA_VISIBLE_DEVICES'] = visible_devices
@@ -48,21 +58,41 @@ def set_seed(seed):
 
     return True
 
-def setup_DDP(rank, world_size = torch.cuda.device_count()):
+def setup_DDP(rank, world_size = torch.cuda.device_count(), backend = "nccl"):
     '''
-    Setup Distributed Data Parallel.
+    Setup Distributed Data Parallel. The default backend is NCCL, whose collectives
+    stay GPU-resident — gloo would bounce every all-reduce through host memory.
+    On a single node the rendezvous goes through a FileStore instead of the TCP
+    store, skipping the socket roundtrips during bootstrap.
     '''
-    os.environ['MASTER_ADDR'] = 'localhost'
-    os.environ['MASTER_PORT'] = '12355'
+    global _ddp_store_file
+
+    # bind this process to its GPU before init, so the NCCL communicator
+    # attaches to the right device instead of everyone defaulting to cuda:0
+    if torch.cuda.is_available(): torch.cuda.set_device(rank)
 
     # initialize the process group
-    dist.init_process_group("nccl", rank=rank, world_size=world_size)
+    if world_size == torch.cuda.device_count():
+       # all ranks live under the same spawn parent, so getppid() agrees across them
+       _ddp_store_file = F"/tmp/ddp-store-{os.getppid()}"
+       store = dist.FileStore(_ddp_store_file, world_size)
+       dist.init_process_group(backend, store=store, rank=rank, world_size=world_size)
+    else:
+       os.environ['MASTER_ADDR'] = 'localhost'
+       os.environ['MASTER_PORT'] = '12355'
+       dist.init_process_group(backend, rank=rank, world_size=world_size)
+
+# rendezvous file shared by the ranks on this node, removed in cleanup_DDP()
+_ddp_store_file = None
 
 def cleanup_DDP():
     '''
     Destroy Distributed Data Parallel.
     '''
     dist.destroy_process_group()
+    if _ddp_store_file is not None and os.path.exists(_ddp_store_file):
+       try: os.remove(_ddp_store_file)
+       except OSError: pass
 
 def relative_MSE(x, y, epsilon = 0):
     '''
@@ -72,7 +102,31 @@ def relative_MSE(x, y, epsilon = 0):
     '''
 
     assert x.shape == y.shape, 'the input tensors should have the same shape!'
-    return ((x - y) ** 2).sum() / (y ** 2).sum()     
+    # fused subtract-square-reduce kernel, no full-size (x - y) ** 2 intermediate
+    return fn.mse_loss(x, y, reduction = 'sum') / y.pow(2).sum()
+
+def adaptive_batch_metrics(data_x, x_hat):
+    '''
+    Sum of per-snapshot MSE and relative MSE for an adaptive batch, computed in one
+    padded pass instead of one kernel launch per snapshot: the padded tails are zero
+    in both tensors so they add nothing to any sum, and the per-snapshot
+    normalisations use the true element counts.
+
+    Input:
+    ---
+    data_x: [list of torch tensors] the adaptive snapshots.
+    x_hat: [list of torch tensors] the reconstructions, same shapes as data_x.
+
+    Output:
+    ---
+    mse_sum: [torch.float] sum over the batch of per-snapshot MSE.
+    rel_sum: [torch.float] sum over the batch of per-snapshot relative MSE (normalised by x_hat).
+    '''
+    X = pad_snapshot_list(data_x)
+    Y = pad_snapshot_list(x_hat)
+    sq = ((X - Y) ** 2).flatten(1).sum(-1)
+    numels = torch.as_tensor([x_i.numel() for x_i in data_x], device = sq.device, dtype = sq.dtype)
+    return (sq / numels).sum(), (sq / (Y ** 2).flatten(1).sum(-1)).sum()
 
 def save_model(model, optimizer, check_gap, n_epoches, save_path, dict_only = False):
     '''
@@ -101,7 +155,7 @@ def save_model(model, optimizer, check_gap, n_epoches, save_path, dict_only = Fa
       print('model saved to', model_name)
     print('model_dict saved to', model_dictname)
 
-def train(autoencoder, variational, optimizer, criterion, other_metric, dataloader, shuffle_sfc, shuffle_sfc_with_batch, rank = None):
+def train(autoencoder, variational, optimizer, criterion, other_metric, dataloader, shuffle_sfc, shuffle_sfc_with_batch, rank = None, precision = 'fp32', accum_steps = 1):
   '''
   This function is implemented for training the model.
 
@@ -124,38 +178,60 @@ def train(autoencoder, variational, optimizer, criterion, other_metric, dataload
   whole_KL/ data_length: [torch.float with no grad] KL divergence loss for the batch
   '''
   autoencoder.train()
-  train_loss, train_loss_other, data_length = 0, 0, len(dataloader.dataset)
-  if variational: 
-     whole_KL = 0
-     whole_MSE = 0
+  data_length = len(dataloader.dataset)
+  use_autocast = precision in ('fp16', 'bf16')
+  amp_dtype = torch.bfloat16 if precision == 'bf16' else torch.float16
+  # loss scaling is only needed for fp16, the enabled flag makes it a no-op otherwise
+  scaler = torch.cuda.amp.GradScaler(enabled = precision == 'fp16')
+  # the target device never changes mid-epoch, decide it once outside the loop
+  target_device = rank if isinstance(autoencoder, DDP) else device
+  # accumulators start as 0-d device tensors, a python 0 + cuda tensor bounces
+  # through CPU scalar promotion on the first batch
+  train_loss = torch.zeros((), device = target_device)
+  train_loss_other = torch.zeros((), device = target_device)
+  if variational:
+     whole_KL = torch.zeros((), device = target_device)
+     whole_MSE = torch.zeros((), device = target_device)
   count = 0
-  for batch in dataloader:
+  for batch_index, batch in enumerate(dataloader):
       count += batch.size(0)
       # print(count)
-      if isinstance(autoencoder, DDP): batch = batch.to(rank)  # Send batch of images to the GPU
-      else: batch = batch.to(device)
-      optimizer.zero_grad()  # Set optimiser grad to 0
+      # non-blocking H2D copy, overlaps with the previous step's compute on pinned loaders
+      batch = batch.to(target_device, non_blocking = True)  # Send batch of images to the GPU
+      if batch_index % accum_steps == 0: optimizer.zero_grad(set_to_none=True)  # Free optimiser grads instead of zeroing them
+      with torch.autocast(device_type = device.type, dtype = amp_dtype, enabled = use_autocast):
+        if variational:
+          x_hat, KL = autoencoder(batch)
+          MSE = criterion(batch, x_hat)
+        else:
+          x_hat = autoencoder(batch)
+          Loss = criterion(batch, x_hat)  # Calculate MSE loss
+      if use_autocast: x_hat = x_hat.float() # metrics / KL reductions stay in fp32
       if variational:
-        x_hat, KL = autoencoder(batch)
-        MSE = criterion(batch, x_hat)
-        if torch.cuda.device_count() > 1: KL = KL.sum()
-        whole_KL += KL.detach().cpu().numpy() * batch.size(0)
-        whole_MSE += MSE.item() * batch.size(0)
+        if isinstance(autoencoder, DataParallel): KL = KL.sum() # DataParallel returns one KL per replica
+        # keep the running sums on device, .item()/.numpy() per batch forces a
+        # cudaStreamSynchronize; the single sync now happens at logging time
+        whole_KL += KL.detach() * batch.size(0)
+        whole_MSE += MSE.detach() * batch.size(0)
         Loss = MSE.add_(KL) # MSE loss plus KL divergence
-      else:
-        x_hat = autoencoder(batch)
-        Loss = criterion(batch, x_hat)  # Calculate MSE loss
       with torch.no_grad(): other_MSE = other_metric(batch, x_hat)  # Calculate (may be) relative loss
 
-      Loss.backward()  # Back-propagate
-      optimizer.step()
-      train_loss += Loss * batch.size(0)
+      train_loss += Loss.detach() * batch.size(0)
       train_loss_other += other_MSE * batch.size(0)
 
-      del x_hat
-      del batch
-      del Loss
-      del other_MSE
+      # gradient accumulation: scale the micro-batch loss, step only every accum_steps
+      # batches, and skip DDP's per-backward all-reduce on the non-final micro-batches
+      if accum_steps > 1: Loss = Loss / accum_steps
+      sync_now = (batch_index + 1) % accum_steps == 0 or batch_index + 1 == len(dataloader)
+      if isinstance(autoencoder, DDP) and not sync_now:
+         with autoencoder.no_sync(): scaler.scale(Loss).backward()  # Back-propagate
+      else: scaler.scale(Loss).backward()  # Back-propagate
+      if sync_now:
+         scaler.step(optimizer)
+         scaler.update()
+
+      if _profiler is not None: _profiler.step()
+
   if variational: return train_loss / data_length, train_loss_other/ data_length, whole_MSE/ data_length, whole_KL/ data_length  # Return Loss, MSE, KL separately.
   else: return train_loss / data_length, train_loss_other/ data_length  # Return MSE
 
@@ -182,22 +258,27 @@ def validate(autoencoder, variational, optimizer, criterion, other_metric, datal
   whole_KL/ data_length: [torch.float with no grad] KL divergence loss for the batch
   '''
   autoencoder.eval()
-  validation_loss, valid_loss_other, data_length = 0, 0, len(dataloader.dataset)
-  if variational: 
-    whole_KL = 0
-    whole_MSE = 0
+  data_length = len(dataloader.dataset)
+  # the target device never changes mid-epoch, decide it once outside the loop
+  target_device = rank if isinstance(autoencoder, DDP) else device
+  # 0-d device-tensor accumulators, see train()
+  validation_loss = torch.zeros((), device = target_device)
+  valid_loss_other = torch.zeros((), device = target_device)
+  if variational:
+    whole_KL = torch.zeros((), device = target_device)
+    whole_MSE = torch.zeros((), device = target_device)
   count = 0
   for batch in dataloader:
     with torch.no_grad():
       count += batch.size(0)
-      if not isinstance(autoencoder, DDP): batch = batch.to(device)  # Send batch of images to the GPU
-      else: batch = batch.to(rank)
+      batch = batch.to(target_device, non_blocking = True)  # Send batch of images to the GPU
       if variational:
           x_hat, KL = autoencoder(batch)
           MSE = criterion(batch, x_hat)
-          if torch.cuda.device_count() > 1: KL = KL.sum()
-          whole_KL += KL.detach().cpu().numpy() * batch.size(0)
-          whole_MSE += MSE.item() * batch.size(0)
+          if isinstance(autoencoder, DataParallel): KL = KL.sum() # DataParallel returns one KL per replica
+          # on-device accumulation, see train()
+          whole_KL += KL.detach() * batch.size(0)
+          whole_MSE += MSE.detach() * batch.size(0)
           Loss = MSE.add_(KL) # MSE loss plus KL divergence
       else:
           x_hat = autoencoder(batch)
@@ -205,16 +286,12 @@ def validate(autoencoder, variational, optimizer, criterion, other_metric, datal
       other_MSE = other_metric(batch, x_hat)
       validation_loss += Loss * batch.size(0)
       valid_loss_other += other_MSE * batch.size(0)
-      del batch
-      del x_hat
-      del Loss
-      del other_MSE
 
   if variational: return validation_loss / data_length, valid_loss_other/ data_length, whole_MSE/ data_length, whole_KL/ data_length  # Return Loss, MSE, KL separately.
   else: return validation_loss / data_length, valid_loss_other/ data_length  # Return MSE
 
 
-def train_adaptive(autoencoder, variational, optimizer, criterion, other_metric, dataloader, shuffle_sfc, shuffle_sfc_with_batch, rank = None):
+def train_adaptive(autoencoder, variational, optimizer, criterion, other_metric, dataloader, shuffle_sfc, shuffle_sfc_with_batch, rank = None, precision = 'fp32', accum_steps = 1):
   '''
   This function is implemented for training the model for adaptive datasets.
 
@@ -238,13 +315,25 @@ def train_adaptive(autoencoder, variational, optimizer, criterion, other_metric,
   whole_KL/ data_length: [torch.float with no grad] KL divergence loss for the batch
   '''
   autoencoder.train()
-  train_loss, train_loss_other, data_length = 0, 0, len(dataloader.dataset)
-  if variational: 
-     whole_KL = 0
-     whole_MSE = 0
+  data_length = len(dataloader.dataset)
+  use_autocast = precision in ('fp16', 'bf16')
+  amp_dtype = torch.bfloat16 if precision == 'bf16' else torch.float16
+  # loss scaling is only needed for fp16, the enabled flag makes it a no-op otherwise
+  scaler = torch.cuda.amp.GradScaler(enabled = precision == 'fp16')
+  # 0-d device-tensor accumulators, see train()
+  train_loss = torch.zeros((), device = device)
+  train_loss_other = torch.zeros((), device = device)
+  if variational:
+     whole_KL = torch.zeros((), device = device)
+     whole_MSE = torch.zeros((), device = device)
+  if shuffle_sfc:
+     # draw the whole epoch of sfc choices in one vectorised call: argsort of uniform
+     # noise gives a permutation per row, the first sfc_nums columns are a choice
+     # without replacement — no per-step numpy call stalling the dispatch thread
+     sfc_choices = torch.argsort(torch.rand(len(dataloader), dataloader.dataset.sfc_max_num), -1)[:, :autoencoder.encoder.sfc_nums].numpy()
   count = 0
-  for batch in dataloader:
-      optimizer.zero_grad()  # Set optimiser grad to 0
+  for batch_index, batch in enumerate(dataloader):
+      if batch_index % accum_steps == 0: optimizer.zero_grad(set_to_none=True)  # Free optimiser grads instead of zeroing them
       c_batch_size = len(batch)
       count += c_batch_size
       Loss = 0
@@ -252,7 +341,7 @@ def train_adaptive(autoencoder, variational, optimizer, criterion, other_metric,
       other_MSE = 0
       batch = [list(batch) for batch in zip(*batch)] # swap dimension for the loader
       data_x = batch[0] # adaptive fuild snapshots
-      for i in range(len(data_x)): data_x[i] = data_x[i].to(device).float()
+      for i in range(len(data_x)): data_x[i] = data_x[i].to(device, non_blocking = True).float()
       sfcs = batch[1] # adaptive sfcs
       inv_sfcs = batch[2] # adaptive inv_sfcs
 
@@ -265,58 +354,87 @@ def train_adaptive(autoencoder, variational, optimizer, criterion, other_metric,
 
       if len(batch) == 5: 
          coords = batch[-2] # adaptive coords
-         for i in range(len(coords)): coords[i] = coords[i].to(device).float()
+         for i in range(len(coords)): coords[i] = coords[i].to(device, non_blocking = True).float()
       else: coords = None
       filling_paras = batch[-1] # adaptive filling_paras
-      if shuffle_sfc: sfc_shuffle_index = np.random.choice(dataloader.dataset.sfc_max_num, autoencoder.encoder.sfc_nums, replace=False) # sfc_index, to shuffle
+      if shuffle_sfc: sfc_shuffle_index = sfc_choices[batch_index] # sfc_index, to shuffle
       else: sfc_shuffle_index = None
       if shuffle_sfc_with_batch:
          sfcs = []
          inv_sfcs = []
-         shuffle_index = np.random.permutation(c_batch_size)
+         shuffle_index = torch.randperm(c_batch_size).numpy()
          for i in range(c_batch_size):
-             sfc = copy.deepcopy(batch[1][shuffle_index[i]])
-             inv_sfc = copy.deepcopy(batch[2][shuffle_index[i]])
-             diff_nodes = sfc.shape[-1] - batch[1][i].shape[-1]
+             sfc = batch[1][shuffle_index[i]]
+             inv_sfc = batch[2][shuffle_index[i]]
+             target_nodes = batch[1][i].shape[-1]
+             diff_nodes = sfc.shape[-1] - target_nodes
              if diff_nodes < 0:
                 # paras = gen_filling_paras(sfc.shape[-1], batch[1][i].shape[-1])
                 # sfcs.append(expand_snapshot_backward_connect(sfc, *paras, False, return_clone = True))
                 # inv_sfcs.append(expand_snapshot_backward_connect(inv_sfc, *paras, False, return_clone = True))
-                filling_NN = BackwardForwardConnecting(sfc.shape[-1], batch[1][i].shape[-1])
-                sfcs.append(filling_NN(sfc))
-                inv_sfcs.append(filling_NN(inv_sfc))
-             else: 
-                sfc = sfc[..., :batch[1][i].shape[-1]]
-                inv_sfc = inv_sfc[..., :batch[1][i].shape[-1]]
-                sfc[sfc >= batch[1][i].shape[-1]] -= diff_nodes
-                inv_sfc[inv_sfc >= batch[1][i].shape[-1]] -= diff_nodes
+                # fetch-or-create in the module-level cache: identical length pairs recur
+                # across batches and construction dominates the cheap expansion itself
+                key = (sfc.shape[-1], target_nodes)
+                if key not in _bfc_cache: _bfc_cache[key] = BackwardForwardConnecting(*key)
+                filling_NN = _bfc_cache[key]
+                # the filling layers hold no trainable parameters, skip autograd tracking
+                with torch.no_grad():
+                   sfcs.append(filling_NN(sfc))
+                   inv_sfcs.append(filling_NN(inv_sfc))
+             else:
+                # copy only the truncated slice, the in-place shift below must not touch
+                # the dataset's own orderings
+                if torch.is_tensor(sfc):
+                   sfc = sfc[..., :target_nodes].clone()
+                   inv_sfc = inv_sfc[..., :target_nodes].clone()
+                else:
+                   sfc = np.copy(sfc[..., :target_nodes])
+                   inv_sfc = np.copy(inv_sfc[..., :target_nodes])
+                sfc[sfc >= target_nodes] -= diff_nodes
+                inv_sfc[inv_sfc >= target_nodes] -= diff_nodes
                 sfcs.append(sfc)
                 inv_sfcs.append(inv_sfc)
       if variational:
-        x_hat, KL = autoencoder(data_x, sfcs, inv_sfcs, filling_paras, coords, sfc_shuffle_index)
-        for (data_x_i, x_hat_i) in zip(data_x, x_hat): 
-           MSE += criterion(data_x_i, x_hat_i)
-           with torch.no_grad(): other_MSE += other_metric(data_x_i, x_hat_i)        
-        if torch.cuda.device_count() > 1: KL = KL.sum()
-        whole_KL += KL.detach().cpu().numpy() * c_batch_size
-        whole_MSE += MSE.item()
+        with torch.autocast(device_type = device.type, dtype = amp_dtype, enabled = use_autocast):
+          x_hat, KL = autoencoder(data_x, sfcs, inv_sfcs, filling_paras, coords, sfc_shuffle_index)
+        if use_autocast: x_hat = [x_i.float() for x_i in x_hat] # metrics / KL reductions stay in fp32
+        # both metric sums in one padded pass instead of a kernel launch per snapshot
+        mse_sum, rel_sum = adaptive_batch_metrics(data_x, x_hat)
+        if isinstance(criterion, nn.MSELoss): MSE, other_MSE = mse_sum, rel_sum.detach()
+        else: MSE, other_MSE = rel_sum, mse_sum.detach()
+        if isinstance(autoencoder, DataParallel): KL = KL.sum() # DataParallel returns one KL per replica
+        whole_KL += KL.detach() * c_batch_size
+        whole_MSE += MSE.detach()
         Loss = MSE.add_(KL) # MSE loss plus KL divergence
-      else: 
-          x_hat = autoencoder(data_x, sfcs, inv_sfcs, filling_paras, coords, sfc_shuffle_index)
-          for (data_x_i, x_hat_i) in zip(data_x, x_hat): 
-            if autoencoder.encoder.collect_loss_inside: Loss += autoencoder.decoder.loss
-            else: Loss += criterion(data_x_i, x_hat_i)
-            with torch.no_grad(): other_MSE += other_metric(data_x_i, x_hat_i)
-
-      Loss.backward()  # Back-propagate
-      optimizer.step()
-      train_loss += Loss
+      else:
+          with torch.autocast(device_type = device.type, dtype = amp_dtype, enabled = use_autocast):
+            x_hat = autoencoder(data_x, sfcs, inv_sfcs, filling_paras, coords, sfc_shuffle_index)
+          if use_autocast: x_hat = [x_i.float() for x_i in x_hat] # metrics stay in fp32
+          if autoencoder.encoder.collect_loss_inside:
+             Loss = autoencoder.decoder.loss * len(data_x)
+             with torch.no_grad(): mse_sum, rel_sum = adaptive_batch_metrics(data_x, x_hat)
+             if isinstance(criterion, nn.MSELoss): other_MSE = rel_sum
+             else: other_MSE = mse_sum
+          else:
+             mse_sum, rel_sum = adaptive_batch_metrics(data_x, x_hat)
+             if isinstance(criterion, nn.MSELoss): Loss, other_MSE = mse_sum, rel_sum.detach()
+             else: Loss, other_MSE = rel_sum, mse_sum.detach()
+
+      train_loss += Loss.detach()
       train_loss_other += other_MSE
 
-      del x_hat
-      del batch
-      del Loss
-      del other_MSE
+      # gradient accumulation, see train()
+      if accum_steps > 1: Loss = Loss / accum_steps
+      sync_now = (batch_index + 1) % accum_steps == 0 or batch_index + 1 == len(dataloader)
+      if isinstance(autoencoder, DDP) and not sync_now:
+         with autoencoder.no_sync(): scaler.scale(Loss).backward()  # Back-propagate
+      else: scaler.scale(Loss).backward()  # Back-propagate
+      if sync_now:
+         scaler.step(optimizer)
+         scaler.update()
+
+      if _profiler is not None: _profiler.step()
+
   if variational: return train_loss / data_length, train_loss_other/ data_length, whole_MSE/ data_length, whole_KL/ data_length  # Return Loss, MSE, KL separately.
   else: return train_loss / data_length, train_loss_other/ data_length  # Return MSE    
 
@@ -344,12 +462,18 @@ def validate_adaptive(autoencoder, variational, optimizer, criterion, other_metr
   whole_KL/ data_length: [torch.float with no grad] KL divergence loss for the batch
   '''
   autoencoder.eval()
-  validation_loss, valid_loss_other, data_length = 0, 0, len(dataloader.dataset)
-  if variational: 
-    whole_KL = 0
-    whole_MSE = 0
+  data_length = len(dataloader.dataset)
+  # 0-d device-tensor accumulators, see train()
+  validation_loss = torch.zeros((), device = device)
+  valid_loss_other = torch.zeros((), device = device)
+  if variational:
+    whole_KL = torch.zeros((), device = device)
+    whole_MSE = torch.zeros((), device = device)
+  if shuffle_sfc:
+     # epoch worth of sfc choices drawn up front, see train_adaptive
+     sfc_choices = torch.argsort(torch.rand(len(dataloader), dataloader.dataset.sfc_max_num), -1)[:, :autoencoder.encoder.sfc_nums].numpy()
   count = 0
-  for batch in dataloader:
+  for batch_index, batch in enumerate(dataloader):
     with torch.no_grad():
       c_batch_size = len(batch)
       count += c_batch_size
@@ -358,39 +482,38 @@ def validate_adaptive(autoencoder, variational, optimizer, criterion, other_metr
       other_MSE = 0
       batch = [list(batch) for batch in zip(*batch)] # swap dimension for the loader
       data_x = batch[0] # adaptive fuild snapshots
-      for i in range(len(data_x)): data_x[i] = data_x[i].to(device).float()
+      for i in range(len(data_x)): data_x[i] = data_x[i].to(device, non_blocking = True).float()
       sfcs = batch[1] # adaptive sfcs
       inv_sfcs = batch[2] # adaptive inv_sfcs
       if len(batch) == 5: 
          coords = batch[-2] # adaptive coords
-         for i in range(len(coords)): coords[i] = coords[i].to(device).float()
+         for i in range(len(coords)): coords[i] = coords[i].to(device, non_blocking = True).float()
       else: coords = None
       filling_paras = batch[-1] # adaptive filling_paras
-      if shuffle_sfc: sfc_shuffle_index = np.random.choice(dataloader.dataset.sfc_max_num, autoencoder.encoder.sfc_nums, replace=False) # sfc_index, to shuffle
+      if shuffle_sfc: sfc_shuffle_index = sfc_choices[batch_index] # sfc_index, to shuffle
       else: sfc_shuffle_index = None
       if variational:
         x_hat, KL = autoencoder(data_x, sfcs, inv_sfcs, filling_paras, coords, sfc_shuffle_index)
-        for (data_x_i, x_hat_i) in zip(data_x, x_hat): 
-           MSE += criterion(data_x_i, x_hat_i)
-           other_MSE += other_metric(data_x_i, x_hat_i)        
-        if torch.cuda.device_count() > 1: KL = KL.sum()
-        whole_KL += KL.detach().cpu().numpy() * c_batch_size
-        whole_MSE += MSE.item()
+        # both metric sums in one padded pass instead of a kernel launch per snapshot
+        mse_sum, rel_sum = adaptive_batch_metrics(data_x, x_hat)
+        if isinstance(criterion, nn.MSELoss): MSE, other_MSE = mse_sum, rel_sum
+        else: MSE, other_MSE = rel_sum, mse_sum
+        if isinstance(autoencoder, DataParallel): KL = KL.sum() # DataParallel returns one KL per replica
+        whole_KL += KL.detach() * c_batch_size
+        whole_MSE += MSE.detach()
         Loss = MSE.add_(KL) # MSE loss plus KL divergence
-      else: 
+      else:
           x_hat = autoencoder(data_x, sfcs, inv_sfcs, filling_paras, coords, sfc_shuffle_index)
-          for (data_x_i, x_hat_i) in zip(data_x, x_hat): 
-            if autoencoder.encoder.collect_loss_inside: Loss += autoencoder.decoder.loss
-            else: Loss += criterion(data_x_i, x_hat_i)
-            other_MSE += other_metric(data_x_i, x_hat_i)
+          mse_sum, rel_sum = adaptive_batch_metrics(data_x, x_hat)
+          if autoencoder.encoder.collect_loss_inside: Loss = autoencoder.decoder.loss * len(data_x)
+          elif isinstance(criterion, nn.MSELoss): Loss = mse_sum
+          else: Loss = rel_sum
+          if isinstance(criterion, nn.MSELoss): other_MSE = rel_sum
+          else: other_MSE = mse_sum
 
       validation_loss += Loss
       valid_loss_other += other_MSE
 
-      del batch
-      del x_hat
-      del Loss
-      del other_MSE
 
   if variational: return validation_loss / data_length, valid_loss_other/ data_length, whole_MSE/ data_length, whole_KL/ data_length  # Return Loss, MSE, KL separately.
   else: return validation_loss / data_length, valid_loss_other/ data_length  # Return MSE  
@@ -435,7 +558,9 @@ def train_model(autoencoder,
   lr: [float] the initial learning rate 
   weight_decay: [float] the coefficient for L2 regularization.
   criterion_type: [string] 'MSE' or 'relative_MSE'
-  visualize: [bool] whether do a liveloss plot.
+  visualize: [bool] whether do a liveloss plot. Turn this off for throughput
+             benchmarks: the plot update materializes every logged tensor on
+             the CPU and redraws each epoch.
   seed: [int] the random seed from cuda kernels
   save_path: [string] the path to save the training txt files and model/model_dict.
   dict_only: [bool] only save the model_dict to save memory of the disk for large models.
@@ -447,10 +572,46 @@ def train_model(autoencoder,
   '''
   set_seed(seed)
 
+  # under DDP every rank runs this function: only the master prints, plots and
+  # writes files, otherwise world_size processes contend on stdout and race the writes
+  is_master = rank is None or rank == 0
+  if not is_master: visualize = False
+
+  # loader pipelining: workers + pinned memory overlap the fetch/collate of batch N+1
+  # with the compute of batch N, persistent workers skip the per-epoch respawn
+  if torch.cuda.is_available() and is_master:
+     for loader_name, loader in (('train_loader', train_loader), ('valid_loader', valid_loader)):
+        if isinstance(loader, DataLoader) and loader.num_workers == 0:
+           print(F"Warning: {loader_name} has num_workers = 0, consider num_workers >= 4 with pin_memory = True, persistent_workers = True and prefetch_factor = 4 to overlap data loading with GPU compute.\n")
+
   if 'shuffle_sfc_with_batch' in kwargs.keys():
       shuffle_sfc_with_batch = kwargs['shuffle_sfc_with_batch']
   else: shuffle_sfc_with_batch = False
 
+  # torch.compile the model (fuses elementwise chains, cuts kernel launches)
+  if 'enable_compile' in kwargs.keys(): enable_compile = kwargs['enable_compile']
+  else: enable_compile = False
+
+  # gradient accumulation: optimizer step every accum_steps batches
+  if 'accum_steps' in kwargs.keys(): accum_steps = kwargs['accum_steps']
+  else: accum_steps = 1
+
+  # redraw the liveloss plot only every plot_every epochs, a full matplotlib
+  # re-render per epoch dominates wallclock for short epochs
+  if 'plot_every' in kwargs.keys(): plot_every = kwargs['plot_every']
+  else: plot_every = 1
+
+  # mixed-precision training: 'fp32' (default), 'bf16' or 'fp16' (with grad scaling)
+  if 'precision' in kwargs.keys():
+      precision = kwargs['precision']
+      if precision not in ('fp32', 'bf16', 'fp16'): raise ValueError("precision should be one of 'fp32', 'bf16', 'fp16' !!!")
+  else: precision = 'fp32'
+
+  # trace a few early iterations with torch.profiler, to see whether the loop is
+  # bound by dataloading, communication or compute — view the trace with tensorboard
+  if 'profile' in kwargs.keys(): profile = kwargs['profile']
+  else: profile = False
+
   if isinstance(autoencoder, DDP): 
      variational = autoencoder.module.encoder.variational
      adaptive = isinstance(autoencoder.module, SFC_CAE_Adaptive)
@@ -466,7 +627,7 @@ def train_model(autoencoder,
      train_function = train
      valid_function = validate
   
-  print('torch device num:', torch.cuda.device_count(),'\n')
+  if is_master: print('torch device num:', torch.cuda.device_count(),'\n')
   # if not isinstance(autoencoder, DDP): autoencoder.to(device)
   if torch.cuda.device_count() > 1 and parallel_mode == 'DP':
      print("Let's use", torch.cuda.device_count(), "GPUs!")
@@ -485,21 +646,27 @@ def train_model(autoencoder,
      optimizer_state_dict = state_load['optimizer_state_dict']
   else: epoch_start = 0
   
-  if optimizer_type == 'Adam': optimizer = torch.optim.Adam(autoencoder.parameters(), lr = lr, weight_decay = weight_decay)
-  elif optimizer_type == 'Adamax': optimizer = torch.optim.Adamax(autoencoder.parameters(), lr = lr, weight_decay = weight_decay)
-  elif optimizer_type == 'SGD': optimizer = torch.optim.SGD(autoencoder.parameters(), lr = lr, weight_decay = weight_decay)
-  elif optimizer_type == 'Adagrad': optimizer = torch.optim.Adagrad(autoencoder.parameters(), lr = lr, weight_decay = weight_decay)
-  elif optimizer_type == 'AdamW': optimizer = torch.optim.AdamW(autoencoder.parameters(), lr = lr, weight_decay = weight_decay)
-  # other custom Pytorch optimizers, from https://github.com/rwightman/pytorch-image-models/tree/master/timm/optim
-  elif optimizer_type == 'Nadam': optimizer = tioptim.Nadam(autoencoder.parameters(), lr = lr, weight_decay = weight_decay)
-  elif optimizer_type == 'AdamP': optimizer = tioptim.AdamP(autoencoder.parameters(), lr = lr, weight_decay = weight_decay)
-  elif optimizer_type == 'RAdam': optimizer = tioptim.RAdam(autoencoder.parameters(), lr = lr, weight_decay = weight_decay)
-  elif optimizer_type == 'madgrad': optimizer = tioptim.MADGRAD(autoencoder.parameters(), lr = lr, weight_decay = weight_decay)
-  elif optimizer_type == 'RMSprop': optimizer = tioptim.RMSpropTF(autoencoder.parameters(), lr = lr, weight_decay = weight_decay)
+  if optimizer_type in OPTIMIZERS: optimizer_class = OPTIMIZERS[optimizer_type]
+  elif optimizer_type in TIMM_OPTIMIZERS:
+     from timm import optim as tioptim
+     optimizer_class = getattr(tioptim, TIMM_OPTIMIZERS[optimizer_type])
+  else: raise ValueError("optimizer type %s is not supported !!!" % optimizer_type)
+  optimizer = optimizer_class(autoencoder.parameters(), lr = lr, weight_decay = weight_decay)
 
   if state_load is not None: optimizer.load_state_dict(optimizer_state_dict)
 
-  if criterion_type == 'MSE': 
+  # compile only after the state_dict load, torch.compile prefixes the parameter names
+  if enable_compile and hasattr(torch, 'compile'):
+     net = autoencoder.module if isinstance(autoencoder, (DDP, DataParallel)) else autoencoder
+     if adaptive:
+        # the python loop over variable-length snapshots breaks a whole-graph capture,
+        # compile the encoder / decoder cores separately
+        if not hasattr(net.encoder, '_orig_mod'): net.encoder = torch.compile(net.encoder, mode = 'reduce-overhead', fullgraph = False)
+        if not hasattr(net.decoder, '_orig_mod'): net.decoder = torch.compile(net.decoder, mode = 'reduce-overhead', fullgraph = False)
+     elif net is autoencoder: autoencoder = torch.compile(autoencoder, mode = 'reduce-overhead', fullgraph = False)
+     else: autoencoder.module = torch.compile(net, mode = 'reduce-overhead', fullgraph = False)
+
+  if criterion_type == 'MSE':
       criterion = nn.MSELoss()
       other_metric = relative_MSE
   elif criterion_type == 'relative_MSE': 
@@ -524,49 +691,67 @@ def train_model(autoencoder,
   lr_change_epoches = [int(epoch_start)]
   n_epochs += epoch_start
 
+  if profile:
+     global _profiler
+     _profiler = torch.profiler.profile(
+         activities = [torch.profiler.ProfilerActivity.CPU, torch.profiler.ProfilerActivity.CUDA],
+         schedule = torch.profiler.schedule(wait = 1, warmup = 2, active = 3, repeat = 1),
+         on_trace_ready = torch.profiler.tensorboard_trace_handler(F"./tb/rank{rank if rank is not None else 0}"))
+     _profiler.start()
+
   for epoch in range(epoch_start, n_epochs):
-    print("epoch %d starting......"%(epoch))
+    if is_master: print("epoch %d starting......"%(epoch))
     time_start = time.time()
     if variational:
-      train_loss, train_loss_other, real_train_MSE, train_KL = train_function(autoencoder, variational, optimizer, criterion, other_metric, train_loader, shuffle_sfc, shuffle_sfc_with_batch, rank) 
+      train_loss, train_loss_other, real_train_MSE, train_KL = train_function(autoencoder, variational, optimizer, criterion, other_metric, train_loader, shuffle_sfc, shuffle_sfc_with_batch, rank, precision, accum_steps)
       valid_loss, valid_loss_other, real_valid_MSE, valid_KL = valid_function(autoencoder, variational, optimizer, criterion, other_metric, valid_loader, shuffle_sfc, rank)
     else:
-      train_loss, train_loss_other = train_function(autoencoder, variational, optimizer, criterion, other_metric, train_loader, shuffle_sfc, shuffle_sfc_with_batch, rank)
+      train_loss, train_loss_other = train_function(autoencoder, variational, optimizer, criterion, other_metric, train_loader, shuffle_sfc, shuffle_sfc_with_batch, rank, precision, accum_steps)
       valid_loss, valid_loss_other = valid_function(autoencoder, variational, optimizer, criterion, other_metric, valid_loader, shuffle_sfc, rank)
 
     if isinstance(autoencoder, DDP):
-      dist.all_reduce(train_loss, reduce_op=dist.ReduceOp.SUM)
-      dist.all_reduce(train_loss_other, reduce_op=dist.ReduceOp.SUM)
-      dist.all_reduce(valid_loss, reduce_op=dist.ReduceOp.SUM)
-      dist.all_reduce(valid_loss_other, reduce_op=dist.ReduceOp.SUM)
-      train_loss /= torch.cuda.device_count()
-      train_loss_other /= torch.cuda.device_count()
-      valid_loss /= torch.cuda.device_count()
-      valid_loss_other /= torch.cuda.device_count()
+      # pack the epoch scalars and issue a single all-reduce: each collective pays
+      # a fixed NCCL launch latency, so 4 (8 for VAE) calls cost ~4x of one
+      stats = [train_loss, train_loss_other, valid_loss, valid_loss_other]
+      if variational: stats += [real_train_MSE, train_KL, real_valid_MSE, valid_KL]
+      buf = torch.stack([torch.as_tensor(s, device = train_loss.device) for s in stats])
+      # NCCL averages inside the collective, no separate divide kernel per rank
+      dist.all_reduce(buf, op=dist.ReduceOp.AVG)
+      if variational: train_loss, train_loss_other, valid_loss, valid_loss_other, real_train_MSE, train_KL, real_valid_MSE, valid_KL = buf
+      else: train_loss, train_loss_other, valid_loss, valid_loss_other = buf
+
+    # one packed D2H copy per epoch for all logged scalars, instead of a separate
+    # synchronizing .cpu() per metric
+    scalars = [train_loss, train_loss_other, valid_loss, valid_loss_other]
+    if variational: scalars += [real_train_MSE, train_KL, real_valid_MSE, valid_KL]
+    scalars = [float(s) for s in torch.stack([torch.as_tensor(s, dtype = torch.float32) for s in scalars]).cpu()]
+    if variational: train_loss, train_loss_other, valid_loss, valid_loss_other, real_train_MSE, train_KL, real_valid_MSE, valid_KL = scalars
+    else: train_loss, train_loss_other, valid_loss, valid_loss_other = scalars
 
     if criterion_type == 'MSE':
-        train_MSE_re = train_loss_other.cpu().numpy()
-        valid_MSE_re = valid_loss_other.cpu().numpy()
-        train_MSE = train_loss.cpu().detach().numpy()
-        valid_MSE = valid_loss.cpu().numpy()
+        train_MSE_re = train_loss_other
+        valid_MSE_re = valid_loss_other
+        train_MSE = train_loss
+        valid_MSE = valid_loss
     elif criterion_type == 'relative_MSE':
-        train_MSE = train_loss_other.cpu().numpy()
-        valid_MSE = valid_loss_other.cpu().numpy()
-        train_MSE_re = train_loss.cpu().detach().numpy()
-        valid_MSE_re = valid_loss.cpu().numpy()
+        train_MSE = train_loss_other
+        valid_MSE = valid_loss_other
+        train_MSE_re = train_loss
+        valid_MSE_re = valid_loss
     
-    # do livelossplot if visualize turned-on 
-    if visualize: 
+    # do livelossplot if visualize turned-on
+    if visualize:
       logs = {}
-                 
+
       logs['' + 'log loss'] = train_MSE
       logs['val_' + 'log loss'] = valid_MSE
 
       logs['' + 'log loss (relative)'] = train_MSE_re
-      logs['val_' + 'log loss (relative)'] = valid_MSE_re          
-      
+      logs['val_' + 'log loss (relative)'] = valid_MSE_re
+
+      # always log, only pay for the figure re-render every plot_every epochs
       liveloss.update(logs)
-      liveloss.draw()
+      if epoch % plot_every == 0: liveloss.draw()
 
     time_end = time.time()
     train_MSEs.append(train_MSE)
@@ -574,25 +759,25 @@ def train_model(autoencoder,
     re_train_MSEs.append(train_MSE_re)
     re_valid_MSEs.append(valid_MSE_re)
 
-    if variational:
+    if variational and is_master:
         print('Epoch: ', epoch, '| train loss: %e' % train_MSE, '| train MSE: %e' % real_train_MSE, '| train KL: %e' % train_KL, '\n       \t'  
         '| valid loss: %e' % valid_MSE, '| valid MSE: %e' % real_valid_MSE, '| valid KL: %e' % valid_KL, 
         '\n      \t| train loss (relative): %e' % train_MSE_re, '| valid loss (relative): %e' % valid_MSE_re,
           '\nEpoch %d use: %.2f second.\n' % (epoch, time_end - time_start))
-    else:
+    elif is_master:
         print('Epoch: ', epoch, '| train loss: %e' % train_MSE, '| valid loss: %e' % valid_MSE,
           '\n      \t| train loss (relative): %e' % train_MSE_re, '| valid loss (relative): %e' % valid_MSE_re,
           '\nEpoch %d use: %.2f second.\n' % (epoch, time_end - time_start))
     
     if varying_lr:
-      print("Current learning rate: %.0e"% optimizer.param_groups[0]['lr'])
+      if is_master: print("Current learning rate: %.0e"% optimizer.param_groups[0]['lr'])
       this_loss = train_MSE
       decrease_rate += old_loss - this_loss
       if epoch % check_gap == 0: 
         # print(F'check at epoch {epoch}')
         digits = -np.floor(np.log10(train_MSE))
         decrease_rate *= 10 ** digits
-        print(F'Accumulated loss bewteen two consecutive {check_gap} epoches :%.2e' % (decrease_rate))
+        if is_master: print(F'Accumulated loss bewteen two consecutive {check_gap} epoches :%.2e' % (decrease_rate))
         if decrease_rate < 1e-2:    
          optimizer.param_groups[0]['lr'] /= 2
          check_gap *= 2
@@ -600,27 +785,33 @@ def train_model(autoencoder,
          lr_change_epoches.append(int(epoch))
       decrease_rate = 0
       old_loss = this_loss
-    
-    # torch.cuda.empty_cache() # clean cache after every epoch
-  
-  if variational:
-    test_loss, test_loss_other, real_test_MSE, test_KL = valid_function(autoencoder, variational, optimizer, criterion, other_metric, test_loader, parallel_mode, rank)
-  else:
-    test_loss, test_loss_other = valid_function(autoencoder, variational, optimizer, criterion, other_metric, test_loader, parallel_mode, rank)
 
-  if criterion_type == 'MSE':
-    test_MSE_re = test_loss_other.cpu().numpy()
-    test_MSE = test_loss.cpu().detach().numpy()
-  elif criterion_type == 'relative_MSE':
-      test_MSE = test_loss_other.cpu().numpy()
-      test_MSE_re = test_loss.cpu().detach().numpy()
+  if profile:
+     _profiler.stop()
+     _profiler = None
 
   total_time_end = time.time()
-  
-  if variational:
-    print('test MSE Error: %e' % test_MSE, '| test MSE: %e' % real_test_MSE, '| test KL: %e' % test_KL, '| relative MSE Error: %e' % test_MSE_re, '\n Total time used for training: %.2f hour.' % ((total_time_end - total_time_start)/3600)) 
-  else:
-    print('test MSE Error: %e' % test_MSE, '| relative MSE Error: %e' % test_MSE_re, '\n Total time used for training: %.2f hour.' % ((total_time_end - total_time_start)/3600)) 
+
+  # the final test pass is optional: DDP runs pass test_loader = None and
+  # evaluate once on rank 0 instead of once per rank
+  if test_loader is not None:
+    if variational:
+      test_loss, test_loss_other, real_test_MSE, test_KL = valid_function(autoencoder, variational, optimizer, criterion, other_metric, test_loader, parallel_mode, rank)
+    else:
+      test_loss, test_loss_other = valid_function(autoencoder, variational, optimizer, criterion, other_metric, test_loader, parallel_mode, rank)
+
+    if criterion_type == 'MSE':
+      test_MSE_re = float(test_loss_other)
+      test_MSE = float(test_loss)
+    elif criterion_type == 'relative_MSE':
+      test_MSE = float(test_loss_other)
+      test_MSE_re = float(test_loss)
+
+    if variational:
+      print('test MSE Error: %e' % test_MSE, '| test MSE: %e' % real_test_MSE, '| test KL: %e' % test_KL, '| relative MSE Error: %e' % test_MSE_re, '\n Total time used for training: %.2f hour.' % ((total_time_end - total_time_start)/3600))
+    else:
+      print('test MSE Error: %e' % test_MSE, '| relative MSE Error: %e' % test_MSE_re, '\n Total time used for training: %.2f hour.' % ((total_time_end - total_time_start)/3600))
+  elif is_master: print('Total time used for training: %.2f hour.' % ((total_time_end - total_time_start)/3600))
 
   MSELoss = np.vstack((np.array(train_MSEs), np.array(valid_MSEs))).T
   reMSELoss = np.vstack((np.array(re_train_MSEs), np.array(re_valid_MSEs))).T
@@ -644,7 +835,7 @@ def train_model(autoencoder,
      if isinstance(autoencoder, SFC_CAE_md): AE_type = 'md'
      else:  AE_type = 'normal'
 
-  if save_path is not None:
+  if save_path is not None and is_master:
 
     if varying_lr:
       lr_epoch_lists = np.vstack((np.array(lr_change_epoches), np.array(lr_list))).T
@@ -668,15 +859,163 @@ def train_model(autoencoder,
 
   return autoencoder
 
-def get_sampler(rank, train_set, valid_set, test_set, world_size = torch.cuda.device_count()):
-    train_sampler = distributed.DistributedSampler(train_set, num_replicas=world_size, rank=rank, shuffle=True)
-    valid_sampler = distributed.DistributedSampler(valid_set, num_replicas=world_size, rank=rank, shuffle=True)
-    test_sampler = distributed.DistributedSampler(test_set, num_replicas=world_size, rank=rank, shuffle=True)
-    return train_sampler, valid_sampler, test_sampler
+def get_shards(rank, train_set, valid_set, world_size):
+    '''
+    Strided per-rank shards, built once before the epochs start: DistributedSampler
+    permutes the whole dataset inside every rank each epoch only to keep
+    1/world_size of the indices, a fixed Subset plus the DataLoader's local shuffle
+    does the same job with len(shard) index work per epoch.
+    '''
+    train_shard = torch.utils.data.Subset(train_set, range(rank, len(train_set), world_size))
+    # deterministic order for evaluation: no permutation work, and the valid
+    # losses stay comparable across epochs
+    valid_shard = torch.utils.data.Subset(valid_set, range(rank, len(valid_set), world_size))
+    return train_shard, valid_shard
+
+class _WrappedDataLoader:
+    '''
+    Wrap a DataLoader so the next batch is copied to the GPU on a dedicated memcpy
+    stream while the current batch trains: the compute stream only waits on the
+    copy stream in __next__, turning the H2D transfer into overlapped work.
+
+    Input:
+    ---
+    dataloader: [torch.utils.data.DataLoader] the loader to wrap, ideally with pin_memory = True.
+    rank: [int] the cuda device to prefetch onto.
+    '''
+    def __init__(self, dataloader, rank):
+        self.dataloader = dataloader
+        self.rank = rank
+        self.memcpy_stream = torch.cuda.Stream(rank)
+
+    def __len__(self): return len(self.dataloader)
+
+    @property
+    def dataset(self): return self.dataloader.dataset
+
+    def _prefetch(self):
+        try: batch = next(self._iter)
+        except StopIteration:
+            self.curr_batch = None
+            return
+        # adaptive batches are lists of variable-size tensors, leave those for the
+        # training loop and only prefetch plain tensor batches
+        if torch.is_tensor(batch):
+           with torch.cuda.stream(self.memcpy_stream): batch = batch.to(self.rank, non_blocking = True)
+        self.curr_batch = batch
+
+    def __iter__(self):
+        self._iter = iter(self.dataloader)
+        self._prefetch()
+        return self
+
+    def __next__(self):
+        if self.curr_batch is None: raise StopIteration
+        torch.cuda.current_stream().wait_stream(self.memcpy_stream)
+        batch = self.curr_batch
+        # keep the allocator from recycling this block while the compute stream uses it
+        if torch.is_tensor(batch): batch.record_stream(torch.cuda.current_stream())
+        self._prefetch()
+        return batch
+
+def move_sfc_indexes(net, rank):
+    '''
+    Move the per-curve SFC index arrays of a SFC_CAE onto the rank's device once:
+    the gathers inside the model's forward index with these arrays, and a numpy
+    array (or CPU tensor) index re-uploads the whole index list from host memory
+    on every single batch.
+
+    Input:
+    ---
+    net: [SFC_CAE object] the (unwrapped) autoencoder.
+    rank: [int] the cuda device to move the indexes onto.
+    '''
+    for module in (net.encoder, net.decoder):
+        for name in ('orderings', 'sfc_plus', 'sfc_minus'):
+            arrays = getattr(module, name, None)
+            if not isinstance(arrays, list): continue
+            for i in range(len(arrays)):
+                if not torch.is_tensor(arrays[i]): arrays[i] = torch.from_numpy(np.ascontiguousarray(arrays[i])).long()
+                arrays[i] = arrays[i].to(rank, non_blocking = True)
+
+def find_max_batch_size(autoencoder, sample, batch_size, rank, max_batch_size = 8192):
+    '''
+    Double the batch size until a forward/backward pass runs out of device memory,
+    then fall back one step: larger batches amortise the fixed per-step python and
+    reducer overhead and run fewer optimizer steps per epoch, so the largest size
+    that fits is usually the fastest.
+
+    Input:
+    ---
+    autoencoder: [SFC_CAE object] the model, already on the rank's device.
+    sample: [torch.FloatTensor] one snapshot, used to shape the synthetic batches.
+    batch_size: [int] the starting (known-good) batch size.
+    rank: [int] the cuda device to trial on.
+    max_batch_size: [int] upper bound for the search.
 
-def train_model_DDP(rank, 
+    Output:
+    ---
+    batch_size: [int] the largest trialled batch size that fits.
+    '''
+    autoencoder.train()
+    while batch_size < max_batch_size:
+       trial = batch_size * 2
+       try:
+          batch = torch.randn((trial,) + tuple(sample.shape), device = rank)
+          x_hat = autoencoder(batch)
+          if isinstance(x_hat, tuple): x_hat = x_hat[0]
+          fn.mse_loss(x_hat, batch).backward()
+       except RuntimeError as e:
+          if 'out of memory' not in str(e): raise
+          torch.cuda.empty_cache()
+          break
+       batch_size = trial
+    autoencoder.zero_grad(set_to_none = True)
+    torch.cuda.empty_cache()
+    return batch_size
+
+class _OnDeviceDataLoader:
+    '''
+    Batch iterator over a tensor dataset that already lives on the GPU: each step
+    is one index_select out of device memory, so no worker processes, no collate
+    and no H2D copy sit on the hot path. Shards the snapshots across ranks the way
+    DistributedSampler does, drawing a fresh on-device permutation per epoch when
+    shuffling.
+
+    Input:
+    ---
+    data: [torch.FloatTensor] the full dataset, resident on the rank's device.
+    batch_size: [int] number of snapshots per batch.
+    rank: [int] this process' shard offset.
+    world_size: [int] number of shards.
+    shuffle: [bool] whether to permute the snapshots every epoch.
+    '''
+    def __init__(self, data, batch_size, rank, world_size = 1, shuffle = False):
+        self.data = data
+        self.batch_size = batch_size
+        self.rank = rank
+        self.world_size = world_size
+        self.shuffle = shuffle
+        self.shard_len = len(range(rank, len(data), world_size))
+
+    def __len__(self): return (self.shard_len + self.batch_size - 1) // self.batch_size
+
+    @property
+    def dataset(self):
+        # report this rank's shard (a strided view, no copy): the train loops
+        # normalise their epoch sums by len(dataloader.dataset), which must match
+        # the number of snapshots this rank actually sees — as on the Subset path
+        return self.data[self.rank::self.world_size]
+
+    def __iter__(self):
+        if self.shuffle: order = torch.randperm(len(self.data), device = self.data.device)
+        else: order = torch.arange(len(self.data), device = self.data.device)
+        if self.world_size > 1: order = order[self.rank::self.world_size]
+        return (self.data.index_select(0, idx) for idx in order.split(self.batch_size))
+
+def train_model_DDP(rank,
                     autoencoder,
-                    train_set, 
+                    train_set,
                     valid_set,
                     test_set,
                     batch_size,
@@ -688,36 +1027,107 @@ def train_model_DDP(rank,
                     visualize = True, 
                     seed = 41,
                     save_path = None,
-                    dict_only = False):
-
-    print(f"Running DDP on rank {rank}.")
+                    dict_only = False,
+                    num_workers = 4,
+                    prefetch_factor = 2,
+                    accum_steps = 1,
+                    bucket_cap_mb = 50,
+                    precision = 'fp32',
+                    profile = False,
+                    auto_batch = False,
+                    gpu_preprocess = False):
+
+    # single-GPU short-circuit: the process group, reducer state and all-reduces
+    # buy nothing at world_size 1, train the bare model instead
+    if torch.cuda.device_count() <= 1:
+       print('Only one cuda device visible, training without the DDP wrap.')
+       loader_kwargs = dict(num_workers = num_workers, pin_memory = True)
+       if num_workers > 0: loader_kwargs.update(persistent_workers = True, prefetch_factor = prefetch_factor)
+       return train_model(autoencoder,
+                   DataLoader(dataset=train_set, batch_size=batch_size, shuffle=True, **loader_kwargs),
+                   DataLoader(dataset=valid_set, batch_size=batch_size, **loader_kwargs),
+                   DataLoader(dataset=test_set, batch_size=batch_size, **loader_kwargs),
+                   lr = lr,
+                   n_epochs = n_epochs,
+                   seed = seed,
+                   save_path = save_path,
+                   dict_only = dict_only,
+                   visualize = visualize,
+                   optimizer_type = optimizer_type,
+                   state_load = state_load,
+                   varying_lr = varying_lr,
+                   accum_steps = accum_steps,
+                   precision = precision,
+                   profile = profile)
+
+    if rank == 0: print(f"Running DDP on rank {rank}.")
     setup_DDP(rank, torch.cuda.device_count())
+    # device_count() takes the driver lock on every call, resolve the world size once
+    world_size = dist.get_world_size() if dist.is_initialized() else torch.cuda.device_count()
 
     # create model and move it to GPU with id rank
     autoencoder = autoencoder.to(rank)
-    autoencoder = DDP(autoencoder, device_ids=[rank])
-
-    train_sampler = distributed.DistributedSampler(train_set, rank=rank, num_replicas=torch.cuda.device_count(), shuffle=True)
-    valid_sampler = distributed.DistributedSampler(valid_set, rank=rank, num_replicas=torch.cuda.device_count(), shuffle=True)
-    test_sampler = distributed.DistributedSampler(test_set, rank=rank, num_replicas=torch.cuda.device_count(), shuffle=True)
-    train_loader = DataLoader(dataset=train_set, batch_size=batch_size, sampler=train_sampler)
-    valid_loader = DataLoader(dataset=valid_set, batch_size=batch_size, sampler=valid_sampler)
-    test_loader = DataLoader(dataset=test_set, batch_size=batch_size, sampler=test_sampler)
-
-    # train_sampler, valid_sampler, test_sampler = get_sampler(rank, train_set, valid_set, test_set)
 
-    # print(train_sampler)
-
-    # train_loader = DataLoader(dataset=train_set, batch_size=batch_size, sampler=train_sampler)
-    # valid_loader = DataLoader(dataset=valid_set, batch_size=batch_size, sampler=valid_sampler)
-    # test_loader = DataLoader(dataset=test_set, batch_size=batch_size, sampler=test_sampler)
+    if auto_batch and torch.is_tensor(train_set[0]):
+       # trial on the bare model — an OOM raised inside a DDP collective could hang the group
+       batch_size = find_max_batch_size(autoencoder, train_set[0], batch_size, rank)
+       # settle on the smallest size that fits everywhere so the ranks stay in lockstep
+       consensus = torch.tensor(batch_size, device = rank)
+       dist.all_reduce(consensus, op = dist.ReduceOp.MIN)
+       batch_size = int(consensus)
+       if rank == 0: print(F"auto_batch: using batch size {batch_size}.")
+    # bucket-view grads skip the grad<->bucket copies, the model keeps no running
+    # stats so per-iteration buffer broadcasts are pure overhead, and the autograd
+    # graph is fixed across iterations which lets the static-graph reducer optimize
+    # many small conv layers: a larger bucket than the 25 MB default means fewer
+    # all-reduce launches, and every parameter gets a grad so skip the unused scan.
+    # static_graph lets the C++ reducer pre-plan the bucket order after the first
+    # iteration — keep it that way: no per-parameter python autograd hooks, and
+    # nothing in the loop should walk param.grad tensor-by-tensor from python
+    autoencoder = DDP(autoencoder, device_ids=[rank], gradient_as_bucket_view=True, broadcast_buffers=False, static_graph=True,
+                      bucket_cap_mb=bucket_cap_mb, find_unused_parameters=False)
+
+    # compress the gradient all-reduce to 2 bytes/param — halves the NCCL payload,
+    # bf16 where the hardware supports it, fp16 otherwise
+    from torch.distributed.algorithms.ddp_comm_hooks import default_hooks as comm_hooks
+    if torch.cuda.is_bf16_supported(): autoencoder.register_comm_hook(state=None, hook=comm_hooks.bf16_compress_hook)
+    else: autoencoder.register_comm_hook(state=None, hook=comm_hooks.fp16_compress_hook)
+
+    if gpu_preprocess:
+       # the per-sample preprocessing here is only an SFC index gather, cheap enough
+       # that the worker processes' pickle/unpickle across the multiprocessing queue
+       # costs more than it saves: load in-process and gather with resident indexes
+       num_workers = 0
+       move_sfc_indexes(autoencoder.module, rank)
+
+    # a few thousand floats per snapshot means the whole set often fits on-device:
+    # copy it across once and slice batches straight out of GPU memory, dropping the
+    # DataLoader machinery and the per-batch H2D copy from the hot path entirely
+    preload = torch.is_tensor(train_set) and torch.is_tensor(valid_set)
+    if preload: preload = (train_set.element_size() * train_set.nelement() + valid_set.element_size() * valid_set.nelement()) < 2 * 1024 ** 3
+
+    loader_kwargs = dict(num_workers = num_workers, pin_memory = True)
+    if num_workers > 0: loader_kwargs.update(persistent_workers = True, prefetch_factor = prefetch_factor)
+
+    if preload:
+       train_loader = _OnDeviceDataLoader(train_set.to(rank, non_blocking = True), batch_size, rank, world_size, shuffle = True)
+       valid_loader = _OnDeviceDataLoader(valid_set.to(rank, non_blocking = True), batch_size, rank, world_size)
+    else:
+       train_shard, valid_shard = get_shards(rank, train_set, valid_set, world_size)
+       # worker processes prefetch and collate upcoming batches while the GPU computes,
+       # persistent workers skip the per-epoch respawn, pinned memory enables async H2D
+       # the shuffle stays local to this rank's shard, seeded so runs are repeatable
+       train_loader = DataLoader(dataset=train_shard, batch_size=batch_size, shuffle=True, generator=torch.Generator().manual_seed(seed + rank), **loader_kwargs)
+       valid_loader = DataLoader(dataset=valid_shard, batch_size=batch_size, **loader_kwargs)
 
-    # print('pass here now.')
+       # prefetch the next batch to this rank on a side stream while the current one trains
+       train_loader = _WrappedDataLoader(train_loader, rank)
+       valid_loader = _WrappedDataLoader(valid_loader, rank)
 
     train_model(autoencoder,
-                train_loader, 
+                train_loader,
                 valid_loader,
-                test_loader,
+                None,
                 lr = lr,
                 n_epochs = n_epochs,
                 seed = seed,
@@ -726,8 +1136,24 @@ def train_model_DDP(rank,
                 visualize = visualize,
                 parallel_mode = 'DDP',
                 optimizer_type = optimizer_type,
-                rank = rank)
-
+                rank = rank,
+                accum_steps = accum_steps,
+                precision = precision,
+                profile = profile and rank == 0)
+
+    # one test pass over the whole set on rank 0 only — inside train_model every
+    # rank would run its own shard and pay an extra sync
+    if rank == 0:
+       if preload and torch.is_tensor(test_set): test_loader = _OnDeviceDataLoader(test_set.to(rank, non_blocking = True), batch_size, rank)
+       else: test_loader = _WrappedDataLoader(DataLoader(dataset=test_set, batch_size=batch_size, **loader_kwargs), rank)
+       variational = autoencoder.module.encoder.variational
+       valid_fn = validate_adaptive if isinstance(autoencoder.module, SFC_CAE_Adaptive) else validate
+       results = valid_fn(autoencoder, variational, None, nn.MSELoss(), relative_MSE, test_loader, False, rank)
+       print('test MSE Error: %e' % float(results[0]), '| relative MSE Error: %e' % float(results[1]))
+
+    # keep the other ranks alive until rank 0 finishes the checkpoint write and
+    # test pass, tearing the process group down under it would abort the job
+    dist.barrier()
     cleanup_DDP()
 
     return autoencoder
@@ -27,6 +27,12 @@ import re
 from itertools import permutations
 import itertools
 
+# sparse CSR build for the CG mesh connectivity
+import scipy.sparse as sp
+
+# overlap the vtu disk reads/XML parses while the main thread fills the buffer
+from concurrent.futures import ThreadPoolExecutor
+
 # create an animation
 from matplotlib import animation
 from IPython.display import HTML
@@ -113,47 +119,58 @@ def read_in_files(data_path, file_format='vtu', vtu_fields=None, write_out = Fal
         print("Read in vtu Data......\n")
         bar=progressbar.ProgressBar(maxval=len(path_data))
         bar.start()
-        data = []
+        whole = None
         coords = None
         cells = None
-        start = 0
         # while(True):
         #     if not os.path.exists(F'{file_prefix}%d{file_format}' % start):
         #         print(F'{file_prefix}%d{file_format} not exist, starting number switch to {file_prefix}%d{file_format}' % (start, start+1))
         #         start += 1
         #     else: break
-        for i in range(len(path_data)):
-            data.append([])
-            # vtu_file = meshio.read(F'{file_prefix}%d{file_format}' % i)
-            vtu_file = meshio.read(path_data[i])
-            if not (coords == vtu_file.points).all():
-               coords = vtu_file.points
-               cells = vtu_file.cells_dict
-               print('mesh adapted at snapshot %d' % i)
-            for j in range(len(vtu_fields)):
-                vtu_field = vtu_fields[j]
-                if not vtu_field in vtu_file.point_data.keys():
-                #    raise ValueError(F'{vtu_field} not avaliable in {vtu_file.point_data.keys()} for {file_prefix} %d {file_format}' % i)
-                   raise ValueError(F'{vtu_field} not avaliable in {vtu_file.point_data.keys()} for {path_data[i]}' % i)
-                field = vtu_file.point_data[vtu_field]
-                if j == 0:
-                   if field.ndim == 1: field = field.reshape(field.shape[0], 1)
-                   data[i - start] = field
-                else:
-                   if field.ndim == 1: field = field.reshape(field.shape[0], 1)
-                   data[i - start] = np.hstack((data[i - start], field))
-            cnt_progress +=1
-            bar.update(cnt_progress)
+        # parse the vtu files on a thread pool: the reads block on disk and the XML
+        # parse releases the GIL, so the next files load while this loop consumes
+        # the current one — the buffer fill and mesh check stay on the main thread
+        with ThreadPoolExecutor(max_workers = os.cpu_count()) as executor:
+          for i, vtu_file in enumerate(executor.map(meshio.read, path_data)):
+              # mesh-adaption check: adaption usually changes the node count, so the
+              # shape comparison short-circuits most changed meshes at O(1); only
+              # shape-matching snapshots pay for the exact full comparison, which
+              # stays cheaper than the old (coords == points).all() boolean temp
+              points = vtu_file.points
+              same_mesh = coords is not None and coords.shape == points.shape and np.array_equal(coords, points)
+              if not same_mesh:
+                 coords = points
+                 cells = vtu_file.cells_dict
+                 print('mesh adapted at snapshot %d' % i)
+              fields = []
+              for j in range(len(vtu_fields)):
+                  vtu_field = vtu_fields[j]
+                  if not vtu_field in vtu_file.point_data.keys():
+                  #    raise ValueError(F'{vtu_field} not avaliable in {vtu_file.point_data.keys()} for {file_prefix} %d {file_format}' % i)
+                     raise ValueError(F'{vtu_field} not avaliable in {vtu_file.point_data.keys()} for {path_data[i]}' % i)
+                  field = vtu_file.point_data[vtu_field]
+                  if field.ndim == 1: field = field.reshape(field.shape[0], 1)
+                  fields.append(field)
+              # the snapshot shape is known after the first file: write every snapshot
+              # straight into one preallocated block, a list + np.array at the end
+              # would re-copy the whole dataset and double the peak memory
+              if whole is None: whole = np.empty((len(path_data), fields[0].shape[0], sum(f.shape[-1] for f in fields)), dtype = np.float32)
+              offset = 0
+              for field in fields:
+                  whole[i, :, offset : offset + field.shape[-1]] = field
+                  offset += field.shape[-1]
+              cnt_progress +=1
+              bar.update(cnt_progress)
         bar.finish()
-        whole_data = torch.from_numpy(np.array(data)).float()
+        # from_numpy shares the buffer, no copy on the way into torch
+        whole_data = torch.from_numpy(whole)
         
-        # get rid of zero components
-        zero_compos = 0
-        for i in range(whole_data.shape[-1]):
-            if whole_data[..., i].max() - whole_data[..., i].min() < 1e-8:
-               zero_compos += 1
-               whole_data[..., i:-1] = whole_data[..., i + 1:]
-        if zero_compos > 0 : whole_data = whole_data[..., :-zero_compos]
+        # get rid of zero components: one fused min/max reduction and a single
+        # gather, instead of a full scan plus a slice rewrite per channel
+        flat = whole_data.reshape(-1, whole_data.shape[-1])
+        c_min, c_max = torch.aminmax(flat, dim = 0)
+        keep = (c_max - c_min) >= 1e-8
+        if not keep.all(): whole_data = whole_data[..., keep].contiguous()
 
         if write_out:
            print("\nWriting Tensors......\n")
@@ -199,18 +216,18 @@ def read_parameters(setting_file = 'parameters.ini'):
     This function reads all the parameter settings in a setting file 'parameters.ini', interact with command_train.py, used for command line training on HPC.
     setting_file
     '''
-    f = open(setting_file, 'r')
-    lines = f.readlines()
     # create a dicitionary to store the parameters
     list_p = {}
- 
-    for line in lines[1:]:
-        line = line.strip('\n')
-        ss = re.split('=', line)
-        list_p[ss[0].strip()] = ss[-1].strip()
-    f.close()
-    
-    return list_p  
+
+    # stream the file line by line, str.split beats a regex for a 1-char separator
+    with open(setting_file, 'r') as f:
+        next(f)
+        for line in f:
+            if '=' not in line: continue
+            ss = line.split('=')
+            list_p[ss[0].strip()] = ss[-1].strip()
+
+    return list_p
 
 def sparsify(array, sparse_n=None, conv_layer=None):
   '''
@@ -252,8 +269,9 @@ def sparsify(array, sparse_n=None, conv_layer=None):
     conv_id = type(conv_layer)(*layer_para)
     conv_id.weight.data.fill_(1)
     conv_id.bias.data.fill_(0)
-    with torch.no_grad(): sp_array = torch.cat([conv_id(arr.unsqueeze(0).unsqueeze(0).float()) for arr in array], 1)
-    sp_array = sp_array.squeeze(0)
+    # one batched conv over all rows, instead of a python-level launch per row
+    with torch.no_grad(): sp_array = conv_id(array.unsqueeze(1).float())
+    sp_array = sp_array.squeeze(1)
   return sp_array
 
 def normalize_tensor(tensor):
@@ -270,13 +288,12 @@ def normalize_tensor(tensor):
 
     '''
     if tensor.ndim > 2:
-       t_mean = torch.zeros(tensor.shape[-1])
-       t_std = torch.zeros(tensor.shape[-1])
-       for i in range(tensor.shape[-1]):
-          t_mean[i] = tensor[..., i].mean()
-          t_std[i] = tensor[..., i].std()
-          tensor[...,i] -= t_mean[i]
-          tensor[...,i] /= t_std[i]
+       # per-channel reductions and one broadcast pass over the whole tensor,
+       # instead of a strided pass per channel
+       flat = tensor.reshape(-1, tensor.shape[-1])
+       t_mean = flat.mean(0)
+       t_std = flat.std(0)
+       tensor.sub_(t_mean).div_(t_std)
        return tensor, t_mean, t_std
     else:
         t_mean = torch.mean(tensor)
@@ -300,15 +317,14 @@ def standardlize_tensor(tensor, lower = -1, upper = 1):
     if lower is None and upper is None:
         return tensor, 1, 0
     if tensor.ndim > 2:
-       tk = torch.zeros(tensor.shape[-1])
-       tb = torch.zeros(tensor.shape[-1])
-       for i in range(tensor.shape[-1]):
-          if lower is None: lower = tensor[..., i].min()
-          if upper is None: upper = tensor[..., i].max()
-          tk[i] = (upper - lower) /(tensor[..., i].max() - tensor[..., i].min())
-          tb[i] = (tensor[..., i].max() * lower - tensor[..., i].min() * upper) /(tensor[..., i].max() - tensor[..., i].min())
-          tensor[...,i] *= tk[i]
-          tensor[...,i] += tb[i]
+       # per-channel min/max in one reduction each, then a single broadcast pass
+       flat = tensor.reshape(-1, tensor.shape[-1])
+       t_min, t_max = torch.aminmax(flat, dim = 0)
+       if lower is None: lower = t_min
+       if upper is None: upper = t_max
+       tk = (upper - lower) / (t_max - t_min)
+       tb = (t_max * lower - t_min * upper) / (t_max - t_min)
+       tensor.mul_(tk).add_(tb)
        return tensor, tk, tb
     else:
         if lower is None: lower = tensor.min()
@@ -332,12 +348,12 @@ def denormalize_tensor(tensor, t_mean, t_std):
     tensor: [torch.FloatTensor] denormalised tensor
     '''
     if tensor.ndim > 2:
-       for i in range(tensor.shape[-1]):
-           tensor[...,i] *= t_std[i]
-           tensor[...,i] += t_mean[i]
-       else:
-          tensor *= t_std
-          tensor += t_mean
+       t_std = torch.as_tensor(t_std).to(tensor.device)
+       t_mean = torch.as_tensor(t_mean).to(tensor.device)
+       tensor.mul_(t_std).add_(t_mean)
+    else:
+       tensor *= t_std
+       tensor += t_mean
     return tensor
 
 def destandardlize_tensor(tensor, tk, tb):
@@ -355,15 +371,44 @@ def destandardlize_tensor(tensor, tk, tb):
     tensor: [torch.FloatTensor] destandardlized tensor
     '''
     if tensor.ndim > 2:
-       for i in range(tensor.shape[-1]):
-           tensor[...,i] -= tb[i]
-           tensor[...,i] /= tk[i]
+       tk = torch.as_tensor(tk).to(tensor.device)
+       tb = torch.as_tensor(tb).to(tensor.device)
+       tensor.sub_(tb).div_(tk)
     else:
         tensor -= tb
         tensor /= tk
     return tensor
 
 
+def load_tensor(path):
+    '''
+    Load a snapshot saved with torch.save, memory-mapping it where torch supports
+    it: the tensor then reads straight out of the page cache as it is consumed,
+    instead of a blocking pread chain into a freshly allocated buffer.
+
+    Input:
+    ---
+    path: [string] the .pt file to load.
+
+    Output:
+    ---
+    tensor: [torch.FloatTensor] the loaded snapshot.
+    '''
+    try: return torch.load(path, mmap = True)
+    except (TypeError, RuntimeError): return torch.load(path)
+
+class _StatsDataset(Dataset):
+    '''
+    Helper dataset for the MyTensorDataset statistics scan: __getitem__ returns
+    only the per-channel extrema of a snapshot, so DataLoader workers can run the
+    torch.load and the reduction in parallel.
+    '''
+    def __init__(self, path_dataset): self.dataset = path_dataset
+
+    def __getitem__(self, index): return torch.aminmax(load_tensor(self.dataset[index]), dim = 0)
+
+    def __len__(self): return len(self.dataset)
+
 class MyTensorDataset(Dataset):
     '''
     This class defines a custom dataset used for command line training, covert all your data to .pt files snapshot by snapshot before using it.
@@ -395,8 +440,6 @@ class MyTensorDataset(Dataset):
         self.length = len(path_dataset)
         self.bounded = set_bound
         self.md = md
-        t_max = torch.load(self.dataset[0]).max(0).values.unsqueeze(0)
-        t_min = torch.load(self.dataset[0]).min(0).values.unsqueeze(0)
         cnt_progress = 0
 
         # find tk and tb for the dataset.
@@ -404,15 +447,22 @@ class MyTensorDataset(Dataset):
             print("Computing min and max......\n")
             bar=progressbar.ProgressBar(maxval=self.length)
             bar.start()
-            for i in range(1, self.length):
-              data = torch.load(self.dataset[i])
-              t_max = torch.cat((t_max, data.max(0).values.unsqueeze(0)), 0)
-              t_min = torch.cat((t_min, data.min(0).values.unsqueeze(0)), 0)
+            t_min = None
+            t_max = None
+            # the scan is disk-bound: DataLoader workers overlap the torch.load +
+            # reduction of upcoming snapshots, the main process only folds (C,) rows
+            stats_loader = DataLoader(_StatsDataset(self.dataset), batch_size = None, num_workers = min(8, os.cpu_count()))
+            for data_min, data_max in stats_loader:
+              if t_min is None:
+                 t_min, t_max = data_min, data_max
+              else:
+                 t_min = torch.minimum(t_min, data_min)
+                 t_max = torch.maximum(t_max, data_max)
               cnt_progress +=1
               bar.update(cnt_progress)
             bar.finish()
-            self.t_max = t_max.max(0).values
-            self.t_min = t_min.min(0).values
+            self.t_max = t_max
+            self.t_min = t_min
             self.tk = (upper - lower) / (self.t_max - self.t_min)
             self.tb = (self.t_max * lower - self.t_min * upper) / (self.t_max - self.t_min)
         else: # jump that process, if we have got tk and tb.
@@ -422,7 +472,7 @@ class MyTensorDataset(Dataset):
         print('tb: ', self.tb, '\n')
 
     def __getitem__(self, index):
-        tensor = torch.load(self.dataset[index])
+        tensor = load_tensor(self.dataset[index])
         tensor = (tensor * self.tk + self.tb).float()
         if self.bounded: 
            tensor[..., 0][tensor[..., 0] > 1] = 1
@@ -460,7 +510,7 @@ class AdaptiveDataset(Dataset):
 
 
     '''
-    def __init__(self, tensor_list, num_nodes, sfcs_list = None, inv_sfcs_list = None, coords_list = None, lower=-1, upper=1, tk = None, tb = None, coords_tk = None, coords_tb = None, indexes = None, send_to_gpu = False, interpolate_to_num = None, standardlize = True, fill_nodes_for_standardlize=False):
+    def __init__(self, tensor_list, num_nodes, sfcs_list = None, inv_sfcs_list = None, coords_list = None, lower=-1, upper=1, tk = None, tb = None, coords_tk = None, coords_tb = None, indexes = None, send_to_gpu = False, interpolate_to_num = None, standardlize = True, fill_nodes_for_standardlize=False, permute_by_first_sfc = False):
         self.standardlize = standardlize
         if indexes is None: 
            self.dataset = tensor_list
@@ -481,14 +531,22 @@ class AdaptiveDataset(Dataset):
                 self.inv_sfcs_list.append(inv_sfcs_list[index])
                 self.num_nodes.append(num_nodes[index])
         self.length = len(self.dataset)
+        # store the snapshots already permuted under their first sfc: the first branch's
+        # gather then reads memory contiguously, and the remaining sfcs become relative
+        # permutations (sfc-locality layout, done once at load instead of every forward).
+        self.permute_by_first_sfc = permute_by_first_sfc
+        if permute_by_first_sfc and self.sfcs_list is not None:
+           for i in range(self.length):
+               first_sfc = np.asarray(self.sfcs_list[i][0])
+               first_inv = np.asarray(self.inv_sfcs_list[i][0])
+               self.dataset[i] = self.dataset[i][..., first_sfc]
+               if self.coords is not None: self.coords[i] = self.coords[i][..., first_sfc]
+               # re-express the orderings w.r.t. the permuted storage: row 0 turns into identity
+               self.sfcs_list[i] = first_inv[np.asarray(self.sfcs_list[i])]
+               self.inv_sfcs_list[i] = np.asarray(self.inv_sfcs_list[i])[..., first_sfc]
         self.filling_paras = []
         self.maxnodes = int(num_nodes.max())
         self.sfc_max_num = sfcs_list[0].shape[0]
-        t_max = self.dataset[0].max(-1).values.unsqueeze(0)
-        coords_max = self.coords[0].max(-1).values.unsqueeze(0)
-        t_min = self.dataset[0].min(-1).values.unsqueeze(0)
-        coords_min = self.coords[0].min(-1).values.unsqueeze(0)
-
         self.interpolate_to_num = interpolate_to_num
          
         # gen filling parameters for the dataset
@@ -496,17 +554,26 @@ class AdaptiveDataset(Dataset):
         print("Generate filling parameters......\n")
         bar=progressbar.ProgressBar(maxval=self.length)
         bar.start()    
-        for i in range(self.length): 
-            if self.interpolate_to_num is not None: 
-                interpol_params = linear_interpolate_python_weights(int(self.num_nodes[i]), self.interpolate_to_num)
-                extrapolate_params_coords = linear_interpolate_python_weights(self.interpolate_to_num, int(self.num_nodes[i]))
-                extrapolate_params_conc = linear_interpolate_python_weights(self.interpolate_to_num, int(self.num_nodes[i]), map_back=True)                    
-                self.filling_paras.append((interpol_params, extrapolate_params_coords, extrapolate_params_conc))
+        # the filling structures are pure functions of the node count, so snapshots on the
+        # same mesh share one memoized instance instead of rebuilding it per snapshot;
+        # shared instances also reuse their cached device-side gather indexes.
+        fla_cache = {}
+        for i in range(self.length):
+            nodes_i = int(self.num_nodes[i])
+            if nodes_i in fla_cache:
+                self.filling_paras.append(fla_cache[nodes_i])
+            elif self.interpolate_to_num is not None:
+                interpol_params = linear_interpolate_python_weights(nodes_i, self.interpolate_to_num)
+                extrapolate_params_coords = linear_interpolate_python_weights(self.interpolate_to_num, nodes_i)
+                extrapolate_params_conc = linear_interpolate_python_weights(self.interpolate_to_num, nodes_i, map_back=True)
+                fla_cache[nodes_i] = (interpol_params, extrapolate_params_coords, extrapolate_params_conc)
+                self.filling_paras.append(fla_cache[nodes_i])
             else:
               if self.num_nodes[i] < self.maxnodes:
-                 self.filling_paras.append((BackwardForwardConnecting(int(self.num_nodes[i]), self.maxnodes), BackwardForwardConnecting(self.maxnodes, int(self.num_nodes[i]))))
+                 fla_cache[nodes_i] = (BackwardForwardConnecting(nodes_i, self.maxnodes), BackwardForwardConnecting(self.maxnodes, nodes_i))
+                 self.filling_paras.append(fla_cache[nodes_i])
               else:
-                 self.filling_paras.append(None) 
+                 self.filling_paras.append(None)
             cnt_progress += 1
             bar.update(cnt_progress)
         bar.finish()
@@ -515,6 +582,14 @@ class AdaptiveDataset(Dataset):
         # find tk and tb for the dataset.
         if tk is None or tb is None:
             print("Computing min and max......\n")
+            # preallocated per-snapshot stat rows: growing them with torch.cat would
+            # re-copy every prior row on each append, O(length^2) traffic overall
+            t_max = torch.empty((self.length,) + self.dataset[0].shape[:-1])
+            t_min = torch.empty_like(t_max)
+            coords_max = torch.empty((self.length,) + self.coords[0].shape[:-1])
+            coords_min = torch.empty_like(coords_max)
+            t_min[0], t_max[0] = torch.aminmax(self.dataset[0], dim = -1)
+            coords_min[0], coords_max[0] = torch.aminmax(self.coords[0], dim = -1)
             bar=progressbar.ProgressBar(maxval=self.length)
             bar.start()
             for i in range(1, self.length):
@@ -525,10 +600,9 @@ class AdaptiveDataset(Dataset):
                 #  coords = expand_snapshot_backward_connect(coords[..., self.sfcs_list[i][0]], *self.filling_paras[i], False)
                  data = self.filling_paras[i][0](data)
                  coords = self.filling_paras[i][0](coords)
-              t_max = torch.cat((t_max, data.max(-1).values.unsqueeze(0)), 0)
-              coords_max = torch.cat((coords_max, coords.max(-1).values.unsqueeze(0)), 0)
-              t_min = torch.cat((t_min, data.min(-1).values.unsqueeze(0)), 0)
-              coords_min = torch.cat((coords_min, coords.min(-1).values.unsqueeze(0)), 0)
+              # fused kernels: both extrema in a single pass over each snapshot
+              t_min[i], t_max[i] = torch.aminmax(data, dim = -1)
+              coords_min[i], coords_max[i] = torch.aminmax(coords, dim = -1)
               cnt_progress +=1
               bar.update(cnt_progress)
             bar.finish()
@@ -678,8 +752,13 @@ def get_sfc_curves_from_coords(coords, num):
     starting_node = 0 # =0 do not specifiy a starting node, otherwise, specify the starting node
     whichd, space_filling_curve_numbering = sfc.ncurve_python_subdomain_space_filling_curve(colm, findm, starting_node, graph_trim, ncurve, coords.shape[0], ncolm)
     for i in range(space_filling_curve_numbering.shape[-1]):
-        curve_lists.append(np.argsort(space_filling_curve_numbering[:,i]))
-        inv_lists.append(np.argsort(np.argsort(space_filling_curve_numbering[:,i])))
+        # invert the permutation with an O(N) scatter, the old double argsort
+        # re-sorted a permutation already in hand
+        curve = np.argsort(space_filling_curve_numbering[:,i], kind = 'stable')
+        inv = np.empty_like(curve)
+        inv[curve] = np.arange(curve.size)
+        curve_lists.append(curve)
+        inv_lists.append(inv)
 
     return curve_lists, inv_lists
 
@@ -698,21 +777,51 @@ def get_sfc_curves_from_coords_CG(coords, ncurves, template_vtu):
     curve_lists: [list of 1d-arrays] the list of space-filling curves, each element of shape [number of Nodes, ]
     inv_lists: [list of 1d-arrays] the list of inverse space-filling curves, each element of shape [number of Nodes, ]
     '''
-    ncolm=0
-    colm=[]
-    findm=[0]
-    for nod in range(coords.shape[0]):
-        nodes = template_vtu.GetPointPoints(nod)
-        nodes2 = np.sort(nodes) #sort_assed(nodes) 
-        colm.extend(nodes2[:]) 
-        nlength = nodes2.shape[0]
-        ncolm=ncolm+nlength
-        findm.append(ncolm)
-
-    colm = np.array(colm)
-    colm = colm + 1
-    findm = np.array(findm)
-    findm = findm + 1
+    # bulk connectivity build: every ordered node pair of every cell becomes one
+    # (row, col) entry and a single sparse CSR construction deduplicates and
+    # sorts them, replacing a python-level VTK query plus a sort per node
+    if hasattr(template_vtu, 'cells_dict'): cell_blocks = list(template_vtu.cells_dict.values())
+    else:
+       # vtktools.vtu input: pull the raw cell array off the vtk grid, it only
+       # reshapes cleanly when all cells have the same number of points
+       from vtk.util.numpy_support import vtk_to_numpy
+       cell_data = vtk_to_numpy(template_vtu.ugrid.GetCells().GetData())
+       npts = int(cell_data[0])
+       if cell_data.shape[0] == template_vtu.ugrid.GetNumberOfCells() * (npts + 1): cell_blocks = [cell_data.reshape(-1, npts + 1)[:, 1:]]
+       else: cell_blocks = None
+
+    if cell_blocks is not None:
+       rows = []
+       cols = []
+       for cells in cell_blocks:
+           cells = np.asarray(cells)
+           k = cells.shape[1]
+           rows.append(np.repeat(cells, k, axis = 1).ravel())
+           cols.append(np.tile(cells, (1, k)).ravel())
+       rows = np.concatenate(rows)
+       cols = np.concatenate(cols)
+       adjacency = sp.coo_matrix((np.ones(rows.shape[0], dtype = np.int32), (rows, cols)), shape = (coords.shape[0], coords.shape[0])).tocsr()
+       adjacency.sort_indices()
+       colm = adjacency.indices + 1
+       findm = adjacency.indptr + 1
+       ncolm = colm.shape[0]
+    else:
+       # mixed cell sizes: fall back to the per-node query loop
+       ncolm=0
+       colm=[]
+       findm=[0]
+       for nod in range(coords.shape[0]):
+           nodes = template_vtu.GetPointPoints(nod)
+           nodes2 = np.sort(nodes) #sort_assed(nodes) 
+           colm.extend(nodes2[:]) 
+           nlength = nodes2.shape[0]
+           ncolm=ncolm+nlength
+           findm.append(ncolm)
+
+       colm = np.array(colm)
+       colm = colm + 1
+       findm = np.array(findm)
+       findm = findm + 1
 
     curve_lists = []
     inv_lists = []
@@ -720,8 +829,12 @@ def get_sfc_curves_from_coords_CG(coords, ncurves, template_vtu):
     starting_node = 0 # =0 do not specifiy a starting node, otherwise, specify the starting node
     whichd, space_filling_curve_numbering = sfc.ncurve_python_subdomain_space_filling_curve(colm, findm, starting_node, graph_trim, ncurves, coords.shape[0], ncolm)
     for i in range(space_filling_curve_numbering.shape[-1]):
-       curve_lists.append(np.argsort(space_filling_curve_numbering[:,i]))
-       inv_lists.append(np.argsort(np.argsort(space_filling_curve_numbering[:,i])))
+       # same O(N) scatter inverse as get_sfc_curves_from_coords
+       curve = np.argsort(space_filling_curve_numbering[:,i], kind = 'stable')
+       inv = np.empty_like(curve)
+       inv[curve] = np.arange(curve.size)
+       curve_lists.append(curve)
+       inv_lists.append(inv)
 
     return curve_lists, inv_lists
 
@@ -933,6 +1046,40 @@ def gen_neighbour_keys(ndim, range = 1, direct_neigh = False):
               C.append(lowers)      
           return C     
 
+# in-memory memo for get_neighbourhood_md_cached(), keyed by (shape, neighbour keys)
+_neigh_md_cache = {}
+
+def get_neighbourhood_md_cached(shape, Ax, cache_dir = None):
+    '''
+    Build (or load) the neighbourhood ordering of a canonical arange ordering reshaped
+    to {shape}, memoized in memory and optionally on disk under {cache_dir}. The build
+    is one-time per model, but dominates start-up for ensembles/hyperparameter sweeps
+    on large meshes, so repeated constructions hit the cache instead.
+
+    Input:
+    ---
+    shape: [tuple] the (structured) shape of the ordering, e.g. (input_size,) for 1D.
+    Ax: [list of tuples] the neighbour keys generated by 'gen_neighbour_keys' function.
+    cache_dir: [str or NoneType] a directory to persist the table across runs, default is None (memory only).
+
+    Output:
+    ---
+    ordering_list: [torch.LongTensor] same as get_neighbourhood_md(..., ordering = True).
+    '''
+    key = (tuple(shape), tuple(Ax))
+    if key in _neigh_md_cache: return _neigh_md_cache[key]
+    result = None
+    fname = None
+    if cache_dir is not None:
+       os.makedirs(cache_dir, exist_ok = True)
+       fname = os.path.join(cache_dir, 'neigh_md_' + '_'.join(map(str, shape)) + '_%d.pt' % abs(hash(key)))
+       if os.path.exists(fname): result = torch.load(fname)
+    if result is None:
+       result = get_neighbourhood_md(torch.arange(int(np.prod(shape))).long().reshape(shape), Ax, ordering = True)
+       if fname is not None: torch.save(result, fname)
+    _neigh_md_cache[key] = result
+    return result
+
 def get_neighbour_index(ordering, tuple_i):
     '''
     Get neighbours for a sfc in multi-dimension,
@@ -948,7 +1095,9 @@ def get_neighbour_index(ordering, tuple_i):
     neigh_ordering: [numpy.ndarray] the neighbours in md, same shape to \{ordering\}.
     '''
     ndim = len(tuple_i)
-    neigh_ordering = copy.deepcopy(ordering)
+    # a shallow data copy is all that is needed here, deepcopy walks the whole object
+    if torch.is_tensor(ordering): neigh_ordering = ordering.clone()
+    else: neigh_ordering = np.copy(ordering)
     indices_from = {}
     indices_to = {}
     for i in range(ndim):
@@ -1104,6 +1253,62 @@ class NearestNeighbouring_md(nn.Module):
         tensor_list *= self.weights
         return torch.sum(tensor_list, -1) + self.bias
 
+def nearest_neighbouring_sp_1d(x, sp, self_concat = 1):
+    '''
+    Apply a NearestNeighbouring_md sparse layer {sp} for the 1D (num_neigh = 3) case
+    straight on {x}: computes w * x + (w^-) * (x^-) + (w^+) * (x^+) + b with replicated
+    ends, which is exactly get_concat_list_md followed by sp.forward but done as a
+    sliding window, without materialising the num_neigh x larger neighbour-concat tensor.
+
+    Input:
+    ---
+    x: [torch.FloatTensor] the (sfc-ordered) tensor, of shape (batch, channels, nodes).
+    sp: [NearestNeighbouring_md] a sparse layer built with num_neigh_md = 3.
+    self_concat: [int] same role as in get_concat_list_md, the channel folds of {x}.
+
+    Output:
+    ---
+    The element-wise (hadamard) product and addition, of shape (batch, channels // self_concat, nodes).
+    '''
+    nodes = x.shape[-1]
+    x_minus = fn.pad(x, (1, 0), mode = 'replicate')[..., :nodes]
+    x_plus = fn.pad(x, (0, 1), mode = 'replicate')[..., 1:]
+    w = sp.weights
+    out = 0
+    for g, (x_g, x_m, x_p) in enumerate(zip(torch.chunk(x, self_concat, 1), torch.chunk(x_minus, self_concat, 1), torch.chunk(x_plus, self_concat, 1))):
+        out = out + x_g * w[..., 3 * g] + x_m * w[..., 3 * g + 1] + x_p * w[..., 3 * g + 2]
+    return out + sp.bias
+
+def nearest_neighbouring_sp_md(x, sp, gather_index, num_neigh_md, self_concat = 1):
+    '''
+    The md twin of 'nearest_neighbouring_sp_1d': apply a NearestNeighbouring_md layer
+    {sp} straight on {x} by accumulating one gathered term per neighbour, equivalent to
+    building the neighbour-concat tensor and calling sp.forward, but the num_neigh x
+    larger intermediate (the biggest tensor of the whole decoder) is never materialised.
+
+    Input:
+    ---
+    x: [torch.FloatTensor] the (sfc-ordered) tensor, of shape (batch, channels, nodes).
+    sp: [NearestNeighbouring_md] the sparse layer.
+    gather_index: [torch.LongTensor] per-neighbour gather blocks of shape (num_neigh_md * nodes, ),
+                  i.e. the 'neigh_md_gather' buffer (ordering list modulo node count).
+    num_neigh_md: [int] the number of neighbours plus self.
+    self_concat: [int] same role as in get_concat_list_md, the channel folds of {x}.
+
+    Output:
+    ---
+    The element-wise (hadamard) product and addition, of shape (batch, channels // self_concat, nodes).
+    '''
+    nodes = x.shape[-1]
+    w = sp.weights
+    out = None
+    for g, x_g in enumerate(torch.chunk(x, self_concat, 1) if self_concat > 1 else (x,)):
+        for n in range(num_neigh_md):
+            term = x_g.index_select(-1, gather_index[n * nodes : (n + 1) * nodes]) * w[..., g * num_neigh_md + n]
+            if out is None: out = term
+            else: out = out + term
+    return out + sp.bias
+
 class BackwardForwardConnecting(nn.Module):
     '''
     This class defines the "BackwardForwardConnecting" Layer for the last dim: e.g. [1, 2, 3] -> [1, 2, 3, 2, 1, 2, 3, 2],
@@ -1186,6 +1391,53 @@ class BackwardForwardConnecting(nn.Module):
                  cur_idx += self.para_groups[i]
         return xx
 
+def pad_snapshot_list(x):
+    '''
+    Pack a list of adaptive snapshots into one zero-padded batch tensor, so the
+    per-snapshot Python loops downstream become single-kernel calls on the padded
+    batch. Pure zero padding: the tail is only safe where it is never gathered.
+
+    Input:
+    ---
+    x: [list of torch.FloatTensor] per-snapshot tensors of shape (channels, nodes_k) or (nodes_k, ).
+
+    Output:
+    ---
+    X: [torch.FloatTensor] the padded batch, of shape (batch, channels, max nodes).
+    '''
+    x = [x_k.unsqueeze(0) if x_k.ndim == 1 else x_k for x_k in x]
+    return nn.utils.rnn.pad_sequence([x_k.transpose(0, 1) for x_k in x], batch_first = True).transpose(1, 2).contiguous()
+
+def backward_forward_indexes(bf_layer, device = None):
+    '''
+    Return the gather indexes equivalent to an expanding (interpolate mode)
+    BackwardForwardConnecting layer, i.e. bf_layer(x) == x[..., backward_forward_indexes(bf_layer)],
+    so the filling can be fused into an ordinary index gather. The indexes are
+    cached on the layer after the first call, on {device} if given, so repeated
+    forwards do not pay a host-to-device copy each time.
+
+    Input:
+    ---
+    bf_layer: [BackwardForwardConnecting] an expanding filling layer.
+    device: [torch.device or NoneType] where the indexes will be used, default is None (keep as built).
+
+    Output:
+    ---
+    gather_index: [torch.LongTensor] of shape (output_nodes, )
+    '''
+    if not bf_layer.interpolate:
+       raise ValueError("backward_forward_indexes() only applies to an expanding BackwardForwardConnecting layer!!!")
+    if getattr(bf_layer, 'gather_index', None) is None:
+       parts = []
+       nodes = bf_layer.input_nodes + 1
+       for i, group in enumerate(bf_layer.para_groups):
+           if i % 2 == 0: parts.append(torch.arange(group))
+           else: parts.append(nodes - 1 - torch.arange(group))
+       bf_layer.gather_index = torch.cat(parts)
+    if device is not None and bf_layer.gather_index.device != torch.device(device):
+       bf_layer.gather_index = bf_layer.gather_index.to(device)
+    return bf_layer.gather_index
+
 # @@@@@@@@@@@@@@@@@@@@@@@@@@@@@@@@@@@@@@@@@@@@@ (old way of backward-forward connecting, deprecated.) @@@@@@@@@@@@@@@@@@@@@@@@@@@@@@@@@@@@@
 #
 # def gen_filling_paras(unstructured_size, structured_size):
@@ -1452,10 +1704,10 @@ def linear_interpolate_python(x, prev_nodes, next_nodes, weight_prev, weight_nex
     ---  
     x_out: [np.ndarray or torch.Tensor, same type of input x] the output after interpolation (extrapolation).
     '''
-    if isinstance(x, torch.Tensor): 
+    if isinstance(x, torch.Tensor):
         if x.is_cuda:
-           weight_prev = weight_prev.to(x.device)
-           weight_next = weight_next.to(x.device)
+           weight_prev = weight_prev.to(x.device, non_blocking = True)
+           weight_next = weight_next.to(x.device, non_blocking = True)
     if isinstance(x, np.ndarray) and x.dtype != dtype: x = dtype(x)
     x_out = x[..., prev_nodes] * weight_prev + x[..., next_nodes] * weight_next
     x_out[..., -1] = x[..., -1]
@@ -1463,16 +1715,50 @@ def linear_interpolate_python(x, prev_nodes, next_nodes, weight_prev, weight_nex
        (w2, w1, weight_prev_p1, weight_next_p1) = back_mapping_params
        if isinstance(x, torch.Tensor):
             if x.is_cuda:
-               w2 = w2.to(x.device)
-               w1 = w1.to(x.device)
-               weight_prev_p1 = weight_prev_p1.to(x.device)
-               weight_next_p1 = weight_next_p1.to(x.device)
+               w2 = w2.to(x.device, non_blocking = True)
+               w1 = w1.to(x.device, non_blocking = True)
+               weight_prev_p1 = weight_prev_p1.to(x.device, non_blocking = True)
+               weight_next_p1 = weight_next_p1.to(x.device, non_blocking = True)
        x_out[..., 1:-1] = w2 * x[..., prev_nodes[1:-1]] + \
                      weight_prev_p1 * (x[..., prev_nodes[1:-1] - 1]) + \
                      w1 * x[..., next_nodes[1:-1]] + \
                      weight_next_p1 * (x[..., next_nodes[1:-1] + 1])
     return x_out
 
+def optimize_for_inference(module, example_inputs = None):
+    '''
+    This function prepares a trained (sub)module for deployment: it puts the module in eval
+    mode, compiles it with TorchScript and applies torch.jit.optimize_for_inference(), which
+    freezes the buffers (e.g. 'inv_second_sfc', 'NN_neigh_1d') and fuses activations into the
+    conv kernels. Modules with data-dependent Python control flow (e.g. the adaptive decoder
+    fed with lists of snapshots) cannot be scripted, for those a {example_inputs} tuple should
+    be provided so the module is traced instead; if both fail, the eval-mode module is
+    returned unchanged.
+
+    Input:
+    ---
+    module: [nn.Module] the trained module (e.g. autoencoder.decoder) to freeze.
+    example_inputs: [tuple or NoneType] example inputs for torch.jit.trace(), used as fallback.
+
+    Output:
+    ---
+    module: [torch.jit.ScriptModule or nn.Module] the frozen module, or the eval module if
+            neither scripting nor tracing succeeds.
+    '''
+    module = module.eval()
+    try:
+       scripted = torch.jit.script(module)
+       return torch.jit.optimize_for_inference(scripted)
+    except Exception as error_msg:
+       print('torch.jit.script failed: %s' % error_msg)
+    if example_inputs is not None:
+       try:
+          with torch.no_grad(): traced = torch.jit.trace(module, example_inputs)
+          return torch.jit.optimize_for_inference(traced)
+       except Exception as error_msg:
+          print('torch.jit.trace failed: %s' % error_msg)
+    return module
+
 def ordering_tensor(tensor, ordering):
     '''
     This function orders the tensor in the 0-axis with a provided ordering.
@@ -1783,9 +2069,11 @@ def vtu_compress(data_path, save_path, vtu_fields, autoencoder, tk, tb, start_in
                 tensor[...,k] *= tk[k]
                 tensor[...,k] += tb[k] 
             tensor = tensor.to(model_device)
-            if variational: compressed_tensor, _ = autoencoder.encoder(tensor)
-            else: compressed_tensor = autoencoder.encoder(tensor)
-            compressed_tensor = compressed_tensor.to('cpu') 
+            # pure inference, no autograd graph needed
+            with torch.no_grad():
+               if variational: compressed_tensor, _ = autoencoder.encoder(tensor)
+               else: compressed_tensor = autoencoder.encoder(tensor)
+            compressed_tensor = compressed_tensor.to('cpu')
             print('compressing snapshot %d, shape:' % i, compressed_tensor.shape)
             torch.save(compressed_tensor, save_path +'compressed_%d.pt' % i)
             cnt_progress +=1
@@ -1882,8 +2170,9 @@ def decompress_to_vtu(full_tensor, tamplate_vtu, save_path, vtu_fields, field_sp
             print("Reconstructing vtu %d ......\n" % i)
             filename = F'{save_path}reconstructed_from_latent_%d{file_format}' % i
             tensor = tensor.to(model_device)
-            reconsturcted_tensor = autoencoder.decoder(tensor)
-            reconsturcted_tensor = reconsturcted_tensor.to('cpu') 
+            # pure inference, no autograd graph needed
+            with torch.no_grad(): reconsturcted_tensor = autoencoder.decoder(tensor)
+            reconsturcted_tensor = reconsturcted_tensor.to('cpu')
             for k in range(reconsturcted_tensor.shape[-1]):
                 reconsturcted_tensor[...,k] -= tb[k]
                 reconsturcted_tensor[...,k] /= tk[k]       
@@ -1968,8 +2257,10 @@ def result_vtu_to_vtu(data_path, save_path, vtu_fields, autoencoder, tk, tb, sta
                 tensor[...,k] *= tk[k]
                 tensor[...,k] += tb[k] 
             tensor = tensor.to(model_device)
-            if variational: reconsturcted_tensor, _ = autoencoder(tensor)
-            else: reconsturcted_tensor = autoencoder(tensor)
+            # pure inference, no autograd graph needed
+            with torch.no_grad():
+               if variational: reconsturcted_tensor, _ = autoencoder(tensor)
+               else: reconsturcted_tensor = autoencoder(tensor)
             print('Reconstruction MSE error for snapshot %d: %f' % (i, nn.MSELoss()(tensor, reconsturcted_tensor).item()))
             reconsturcted_tensor = reconsturcted_tensor.to('cpu') 
             for k in range(tensor.shape[-1]):
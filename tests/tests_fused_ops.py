@@ -0,0 +1,167 @@
+"""
+This module contains synthetic-tensor tests for the fused operations in the sfc_cae module,
+each fused operation is asserted against the original (unfused) op it replaces, which is
+still kept in the tree. All inputs are small random tensors, so unlike tests.py no external
+data/pretrained models need to be downloaded.
+
+Author: Jin Yu
+Github handle: acse-jy220
+"""
+
+import pytest
+from sfc_cae import *
+from pytest import fixture # Use pytest fixtures to avoid reloading variables/objects
+
+#################################################### test for fused sparse neighbouring ops in utils.py ######################################################
+
+class TestFusedNeighbouringSp(object):
+    '''
+    The fused 'nearest_neighbouring_sp_1d/md' apply a NearestNeighbouring_md layer straight on
+    the input, they should match 'get_concat_list_md' followed by the layer forward, without
+    materialising the num_neigh x larger neighbour-concat tensor.
+    '''
+    @pytest.mark.parametrize('self_concat', [1, 2])
+    def test_nearest_neighbouring_sp_1d(self, self_concat):
+        torch.manual_seed(0)
+        nodes = 37
+        channels = 2
+        x = torch.randn(4, channels * self_concat, nodes)
+        sp = NearestNeighbouring_md(shape = (nodes,), initial_weight = None, channels = channels, num_neigh_md = 3, self_concat = self_concat)
+        # random weights/bias, the initial constant weights would hide indexing mistakes
+        with torch.no_grad():
+           sp.weights.normal_()
+           sp.bias.normal_()
+        NN_neigh_1d = get_neighbourhood_md(torch.arange(nodes).long(), gen_neighbour_keys(1), ordering = True)
+        expected = sp(get_concat_list_md(x, NN_neigh_1d, 3, self_concat))
+        fused = nearest_neighbouring_sp_1d(x, sp, self_concat)
+
+        assert fused.shape == expected.shape
+        assert torch.allclose(fused, expected, atol = 1e-6)
+
+    @pytest.mark.parametrize('self_concat', [1, 2])
+    def test_nearest_neighbouring_sp_md(self, self_concat):
+        torch.manual_seed(1)
+        shape = (5, 4)
+        nodes = int(np.prod(shape))
+        channels = 2
+        Ax = gen_neighbour_keys(ndim = 2)
+        num_neigh_md = len(Ax) + 1
+        neigh_md = get_neighbourhood_md(torch.arange(nodes).long().reshape(shape), Ax, ordering = True)
+        # the folded gather index, built the same way as the 'neigh_md_gather' buffer
+        gather_index = torch.remainder(neigh_md, nodes)
+        x = torch.randn(3, channels * self_concat, nodes)
+        sp = NearestNeighbouring_md(shape = shape, initial_weight = None, channels = channels, num_neigh_md = num_neigh_md, self_concat = self_concat)
+        with torch.no_grad():
+           sp.weights.normal_()
+           sp.bias.normal_()
+        expected = sp(get_concat_list_md(x, neigh_md, num_neigh_md, self_concat))
+        fused = nearest_neighbouring_sp_md(x, sp, gather_index, num_neigh_md, self_concat)
+
+        assert fused.shape == expected.shape
+        assert torch.allclose(fused, expected, atol = 1e-6)
+
+#################################################### test for backward-forward filling in utils.py ######################################################
+
+class TestBackwardForwardIndexes(object):
+    '''
+    'backward_forward_indexes' turns an expanding BackwardForwardConnecting layer into a plain
+    index gather, the gathered result should match the layer forward exactly.
+    '''
+    @pytest.mark.parametrize('input_nodes, output_nodes', [(10, 47), (16, 53)])
+    def test_gather_matches_filling_layer(self, input_nodes, output_nodes):
+        torch.manual_seed(2)
+        bf_layer = BackwardForwardConnecting(input_nodes, output_nodes, channels = 2)
+        x = torch.randn(3, 2, input_nodes)
+        gather_index = backward_forward_indexes(bf_layer)
+
+        assert gather_index.shape == (output_nodes,)
+        assert torch.equal(x[..., gather_index], bf_layer(x))
+        # the indexes are cached on the layer after the first call
+        assert backward_forward_indexes(bf_layer) is bf_layer.gather_index
+
+    def test_reducing_layer_rejected(self):
+        bf_layer = BackwardForwardConnecting(47, 10, channels = 1)
+        with pytest.raises(ValueError):
+           backward_forward_indexes(bf_layer)
+
+#################################################### test for sfc_cae_adaptive.py ######################################################
+
+@fixture(scope='module')
+def autoencoder_adaptive():
+    """
+    Intialize a small SFC_CAE_Adaptive on synthetic sizes, no data download needed
+    """
+
+    # parameters for intialising
+    input_size = 4096
+    dimension = 2
+    components = 1
+    structured = False
+    self_concat = 2
+    nearest_neighbouring = False
+    dims_latent = 16
+    sfc_nums = 2
+    activation = nn.Tanh()
+    variational = False
+    coords_dimension = 2
+
+    torch.manual_seed(3)
+    autoencoder = SFC_CAE_Adaptive(input_size,
+                          dimension,
+                          components,
+                          structured,
+                          self_concat,
+                          nearest_neighbouring,
+                          dims_latent,
+                          sfc_nums,
+                          activation,
+                          variational,
+                          coords_dimension,
+                          coords = torch.randn(input_size, coords_dimension),
+                          num_final_channels = 12)
+
+    return autoencoder
+
+
+class Test_SFC_CAE_Adaptive_fused_ops(object):
+    '''
+    Test for the fused forward rewrites in sfc_cae_adaptive.py
+    '''
+    def test_fold_first_conv(self, autoencoder_adaptive):
+        '''
+        'fold_first_conv' applies the first conv on the un-duplicated input, it should match
+        duplicating the channels with torch.cat and running the conv unchanged.
+        '''
+        torch.manual_seed(4)
+        encoder = autoencoder_adaptive.encoder
+        conv = nn.Conv1d(3 * encoder.self_concat, 8, kernel_size = 5, stride = 2, padding = 2)
+        a = torch.randn(3, 3, 101)
+        with torch.no_grad():
+           expected = conv(torch.cat([a] * encoder.self_concat, 1))
+           folded = encoder.fold_first_conv(a, conv, 1)
+
+        assert folded.shape == expected.shape
+        assert torch.allclose(folded, expected, atol = 1e-5)
+
+    def test_batched_inverse_decode(self, autoencoder_adaptive):
+        '''
+        With uniform node counts and no filling the decoder takes the batched inverse-ordering
+        path, it should reproduce the per-snapshot loop (forced here with identity filling
+        callables, so both runs compute the same maths) in values and in output shapes.
+        '''
+        torch.manual_seed(5)
+        np.random.seed(5)
+        decoder = autoencoder_adaptive.decoder
+        batch_size = 3
+        input_size = decoder.input_size
+        z = torch.randn(batch_size, decoder.dims_latent)
+        inv_sfcs = [[np.random.permutation(input_size) for _ in range(decoder.sfc_nums)] for _ in range(batch_size)]
+
+        with torch.no_grad():
+           batched = decoder(z, inv_sfcs, [None] * batch_size)
+           looped = decoder(z, inv_sfcs, [(None, lambda b_k: b_k)] * batch_size)
+
+        assert len(batched) == len(looped) == batch_size
+        for b_z, l_z in zip(batched, looped):
+            assert b_z.shape == (input_size,)
+            assert torch.allclose(b_z, l_z, atol = 1e-6)